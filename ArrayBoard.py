@@ -0,0 +1,393 @@
+"""
+Array-backed board for the game purge.
+
+Instead of one `Cell` stack per square, the board is stored as a few integer
+layers (base, occupant, disease and the `noUpdateCnt` timer), a few bytes per
+square instead of a `Cell` and its list. `ArrayGrid` and `ArrayCell` expose
+the same API as `Purge.map` and `Cell`, so the rest of the game runs unchanged
+on top of the layers and plays the same games as on a `Cell` map.
+
+Round processing works on the layers: the frontier of every city comes from a
+whole-board edge mask (see `edgeDiseases`) instead of being updated square by
+square, and the overrun check counts the infected squares of every city with
+one `bincount` (see `overrunCities`).
+
+Requires numpy, which is only needed when a `Purge` game is created with
+`array_board=True`.
+"""
+from __future__ import annotations
+import warnings
+from typing import *
+from Utils import *
+from Characters import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from Purge import Purge
+
+BASE_EMPTY = -1
+"Base layer value of a square with nothing on it"
+BASE_TREE = -2
+"Base layer value of a tree square"
+BASE_ROAD = -3
+"Base layer value of a road square, city squares store their city index (>= 0)"
+
+OCC_NONE, OCC_DOCTOR, OCC_KNIGHT, OCC_NURSE = 0, 1, 2, 4
+"Occupant layer bits, a square can hold one pawn of each kind"
+
+
+class ArrayBoard():
+    """
+    Layered board of a Purge game.
+    - `base`: city index, `BASE_TREE`, `BASE_ROAD` or `BASE_EMPTY`
+    - `occupant`: `OCC_*` bits of the pawns standing on the square
+    - `disease`: whether the square is infected
+    - `timer`: the round the `noUpdateCnt` of the square runs out, on the game's `CellTimers` clock
+    """
+    BYTES_PER_SQUARE = 9
+    "Memory of the layers per square (int16 base + int8 occupant + bool disease + int32 timer + bool gate)"
+    RESCAN_RATIO = 0.25
+    "Share of the cities with an out of date frontier above which `edgeDiseases` rescans the whole board"
+
+    def __init__(self, purge: Purge, M: int, N: int) -> None:
+        if np is None:
+            raise RuntimeError("The array-backed board requires numpy to be installed")
+        self.purgeRef = purge
+        "A reference to a Purge game"
+        self.M, self.N = M, N
+        "The dimensions of the board"
+        self.base = np.full((M, N), BASE_EMPTY, dtype=np.int16)
+        self.occupant = np.zeros((M, N), dtype=np.int8)
+        self.disease = np.zeros((M, N), dtype=bool)
+        self.timer = np.zeros((M, N), dtype=np.int32)
+        self.gate = np.zeros((M, N), dtype=bool)
+        "Gate squares, filled in by `freeze` once the roads are built"
+
+        self.cityObjs: List[City] = []
+        "City objects, indexed by their value in the base layer"
+        self.cityCodes: Dict[City, int] = {}
+        "Reverse lookup of `cityObjs`"
+        self.citySizes = np.zeros(0, dtype=np.int32)
+        "Cell count of each city, filled in by `freeze`"
+        self.cityBoxes: List[Tuple[slice, slice]] = []
+        "Rows and columns of each city and the squares around it, filled in by `freeze`"
+        self._edges: Dict[int, List[Disease]] = None
+        "Edge diseases of each city by city index, a city is dropped when a square around it changes"
+        self.occupants: Dict[Tuple[int, int], List[object]] = {}
+        "Pawn objects standing on the board from bottom to top, keyed by position"
+        self.diseases: Dict[Tuple[int, int], Disease] = {}
+        "Disease objects on the board, keyed by position"
+        self.grid = ArrayGrid(self)
+        "`Purge.map` compatible view over the layers"
+
+    def reset(self) -> None:
+        "Hard reset the board to empty"
+        self.base.fill(BASE_EMPTY)
+        self.occupant.fill(OCC_NONE)
+        self.disease.fill(False)
+        self.timer.fill(0)
+        self.gate.fill(False)
+        self.cityObjs, self.cityCodes, self._edges = [], {}, None
+        self.occupants.clear()
+        self.diseases.clear()
+
+    def freeze(self, cities: List[City]) -> None:
+        """Record the static parts of the map (gates, city sizes)
+            Should be called once the map generation is done
+        """
+        for city in cities:
+            for i, j in city.gatePositions:
+                self.gate[i, j] = True
+        self.citySizes = np.bincount(self.base[self.base >= 0], minlength=len(self.cityObjs))
+        self.cityBoxes = []
+        for city in self.cityObjs:
+            rows, cols = [i for i, _ in city.cells_pos], [j for _, j in city.cells_pos]
+            self.cityBoxes.append((slice(max(min(rows) - 1, 0), max(rows) + 2),
+                                   slice(max(min(cols) - 1, 0), max(cols) + 2)))
+
+    def copyFor(self, purge: Purge, memo: Dict[int, object]) -> ArrayBoard:
+        """This board in `purge`, a copy of its game. The static layers (base, 
+            gates, city sizes and boxes) are shared, the others are copied
+        ## params
+            - `memo`: the copy of each city, disease and pawn, keyed by `id` of the original
+        """
+        board = ArrayBoard.__new__(ArrayBoard)
+        board.purgeRef, board.M, board.N = purge, self.M, self.N
+        board.base, board.gate, board.citySizes, board.cityBoxes = self.base, self.gate, self.citySizes, self.cityBoxes
+        board.occupant, board.disease, board.timer = self.occupant.copy(), self.disease.copy(), self.timer.copy()
+        board.cityObjs = [memo[id(city)] for city in self.cityObjs]
+        board.cityCodes = {city: k for k, city in enumerate(board.cityObjs)}
+        board.occupants = {pos: [memo[id(pawn)] for pawn in pawns] for pos, pawns in self.occupants.items()}
+        board.diseases = {pos: memo[id(d)] for pos, d in self.diseases.items()}
+        board._edges = None if self._edges is None else {
+            code: [memo[id(d)] for d in edges] for code, edges in self._edges.items()}
+        board.grid = ArrayGrid(board)
+        return board
+
+    # =============================
+    # Single square access
+    # =============================
+    def stack(self, i: int, j: int) -> List[object]:
+        "Objects on the square, from bottom to top"
+        res = []
+        if (b:= self.peekBase(i, j)) is not None: res.append(b)
+        if self.disease[i, j]: res.append(self.diseases[(i, j)])
+        if self.occupant[i, j]: res.extend(self.occupants[(i, j)])
+        return res
+
+    def peek(self, i: int, j: int) -> Union[object, None]:
+        "Top most object on the square"
+        if self.occupant[i, j]: return self.occupants[(i, j)][-1]
+        if self.disease[i, j]: return self.diseases[(i, j)]
+        return self.peekBase(i, j)
+
+    def peekBase(self, i: int, j: int) -> Union[object, None]:
+        "Bottom most object on the square"
+        b = int(self.base[i, j])
+        if b >= 0: return self.cityObjs[b]
+        return TREE if b == BASE_TREE else ROAD if b == BASE_ROAD else None
+
+    def put(self, i: int, j: int, val: object) -> bool:
+        """Put an object on the square
+        ### return
+            - `bool`: `False` if the square already holds an object of that kind
+        """
+        if isType(val, Disease):
+            if self.disease[i, j]: return False
+            self.disease[i, j] = True
+            self.diseases[(i, j)] = val
+        elif isType(val, [Doctor, Knight, Nurse]):
+            bit = self._occupantBit(val)
+            if self.occupant[i, j] & bit: return False
+            self.occupant[i, j] |= bit
+            self.occupants.setdefault((i, j), []).append(val)
+        else:
+            if self.base[i, j] != BASE_EMPTY: return False
+            self.base[i, j] = self._baseCode(val)
+        self._touched(i, j)
+        return True
+
+    def pop(self, i: int, j: int) -> Union[object, None]:
+        "Remove and return the top most object unless only the base is left"
+        if self.occupant[i, j]:
+            return self._removeOccupant(i, j, self.occupants[(i, j)][-1])
+        if self.disease[i, j]:
+            self.disease[i, j] = False
+            self._touched(i, j)
+            return self.diseases.pop((i, j))
+        return None
+
+    def remove(self, i: int, j: int, val: object) -> None:
+        "Remove an object from the square ignoring the order"
+        if any(val is pawn for pawn in self.occupants.get((i, j), ())):
+            self._removeOccupant(i, j, val)
+        elif self.diseases.get((i, j)) is val:
+            self.disease[i, j] = False
+            del self.diseases[(i, j)]
+            self._touched(i, j)
+        elif self.peekBase(i, j) is val:
+            self._touched(i, j)
+            self.base[i, j] = BASE_EMPTY
+        else:
+            raise ValueError(f"Square ({i},{j}) does not hold {val.__class__}")
+
+    def clear(self, i: int, j: int) -> None:
+        "Remove everything from the square"
+        self._touched(i, j)
+        self.base[i, j], self.occupant[i, j], self.disease[i, j] = BASE_EMPTY, OCC_NONE, False
+        self.occupants.pop((i, j), None)
+        self.diseases.pop((i, j), None)
+
+    def _touched(self, i: int, j: int) -> None:
+        "Drop the cached edge diseases of the cities whose frontier may change with the square"
+        if (edges:= self._edges) is None: return
+        base = self.base
+        edges.pop(int(base[i, j]), None)
+        for ni, nj in self.purgeRef.stencils.adjacent(i, j):
+            edges.pop(int(base[ni, nj]), None)
+
+    @staticmethod
+    def _occupantBit(val: object) -> int:
+        return OCC_DOCTOR if isType(val, Doctor) else OCC_KNIGHT if isType(val, Knight) else OCC_NURSE
+
+    def _removeOccupant(self, i: int, j: int, val: object) -> object:
+        pawns = self.occupants[(i, j)]
+        pawns.remove(val)
+        if not pawns: del self.occupants[(i, j)]
+        self.occupant[i, j] &= ~self._occupantBit(val)
+        self._touched(i, j)
+        return val
+
+    def _baseCode(self, val: object) -> int:
+        if isType(val, City):
+            if (code:= self.cityCodes.get(val)) is None:
+                code = self.cityCodes[val] = len(self.cityObjs)
+                self.cityObjs.append(val)
+            return code
+        return BASE_TREE if isType(val, Tree) else BASE_ROAD
+
+    # =============================
+    # Whole board operations
+    # =============================
+    @staticmethod
+    def _anyAdjacent(mask):
+        "For each square, whether any of its 4 adjacent squares is set in `mask`"
+        res = np.zeros_like(mask)
+        res[1:, :]  |= mask[:-1, :]
+        res[:-1, :] |= mask[1:, :]
+        res[:, 1:]  |= mask[:, :-1]
+        res[:, :-1] |= mask[:, 1:]
+        return res
+
+    def _edgeMask(self, rows: slice=slice(None), cols: slice=slice(None)):
+        """Squares of `rows`, `cols` holding a disease at the edge of its blob, same rule
+            as `City.isEdge`: next to a free city square, or a gate next to a free road square
+        """
+        base, disease = self.base[rows, cols], self.disease[rows, cols]
+        notOccupied = self.occupant[rows, cols] == OCC_NONE
+        free = notOccupied & ~disease
+        nearCity = self._anyAdjacent(free & (base >= 0))
+        nearRoad = self._anyAdjacent(free & (base == BASE_ROAD))
+        return disease & notOccupied & (base >= 0) & (nearCity | (self.gate[rows, cols] & nearRoad))
+
+    def _scanEdges(self) -> None:
+        "Find the edge diseases of every city from one pass over the whole board"
+        idx = np.flatnonzero(self._edgeMask())
+        codes = self.base.ravel()[idx]
+        order = np.argsort(codes, kind="stable")
+        idx = idx[order].tolist()
+        bounds = np.searchsorted(codes[order], np.arange(len(self.cityObjs) + 1)).tolist()
+        N, diseases = self.N, self.diseases
+        self._edges = {code: [diseases[divmod(k, N)] for k in idx[bounds[code]:bounds[code + 1]]]
+                       for code in range(len(self.cityObjs))}
+
+    def edgeDiseases(self, city: City) -> List[Disease]:
+        """Diseases of `city` at the edge of their blob in row-major order
+            Cached per city: a city whose squares changed is looked at again in its box
+            only, or the whole board is scanned again if many cities changed
+        """
+        code, edges = self.cityCodes[city], self._edges
+        if edges is not None and (res:= edges.get(code)) is not None: return res
+        if edges is None or len(edges) < len(self.cityObjs) * (1 - self.RESCAN_RATIO):
+            self._scanEdges()
+            return self._edges[code]
+        rows, cols = self.cityBoxes[code]
+        mask = self._edgeMask(rows, cols) & (self.base[rows, cols] == code)
+        width, diseases = mask.shape[1], self.diseases
+        res = edges[code] = [diseases[(rows.start + k // width, cols.start + k % width)]
+                             for k in np.flatnonzero(mask).tolist()]
+        return res
+
+    def infectedCounts(self):
+        "Count of infected squares in each city, indexed by city index"
+        return np.bincount(self.base[self.disease & (self.base >= 0)], minlength=len(self.cityObjs))
+
+    def overrunCities(self, threshold: float=City.OVERRUN_RATIO) -> List[City]:
+        "Cities whose infected percentage is above the threshold, rounded as in `City.getInfectPercentage`"
+        counts, sizes = self.infectedCounts().tolist(), self.citySizes.tolist()
+        return [city for city, cnt, size in zip(self.cityObjs, counts, sizes) if round(cnt / size, 2) > threshold]
+
+
+
+# =============================
+# Cell compatible views
+# =============================
+class ArrayCell():
+    """View of a single square of an `ArrayBoard` with the same API as `Cell`"""
+    __slots__ = ("board", "i", "j")
+
+    def __init__(self, board: ArrayBoard, i: int, j: int) -> None:
+        self.board, self.i, self.j = board, i, j
+
+    @property
+    def stk(self) -> List[object]:
+        return self.board.stack(self.i, self.j)
+
+    @property
+    def noUpdateCnt(self) -> int:
+        return self.board.purgeRef.timers.remaining(int(self.board.timer[self.i, self.j]))
+
+    @noUpdateCnt.setter
+    def noUpdateCnt(self, val: int) -> None:
+        self.board.timer[self.i, self.j] = self.board.purgeRef.timers.schedule(val)
+
+    @property
+    def canBeUpdate(self) -> bool:
+        return self.board.timer[self.i, self.j] <= self.board.purgeRef.timers.round
+
+    def __len__(self):
+        return len(self.stk)
+
+    def putOnTop(self, val: object) -> bool:
+        "Add to cell, `False` if it already holds the same type of object"
+        if not self.board.put(self.i, self.j, val):
+            LOGGER.debug("Cell already contains a: %s", val.__class__)
+            return False
+        return True
+
+    def pop(self):
+        "Pop the top most element unless there is only one left"
+        if (val:= self.board.pop(self.i, self.j)) is None:
+            warnings.warn("Cannot pop cell. Reached the base!")
+        return val
+
+    def peek(self):
+        "Peek the top most element of the cell"
+        return self.board.peek(self.i, self.j)
+
+    def peekBase(self):
+        "Peek what's the base of this cell (city, tree, or road)"
+        return self.board.peekBase(self.i, self.j)
+
+    def getElemFromStack(self, val: type) -> Union[object, None]:
+        for el in self.stk:
+            if isType(el, val): return el
+        return None
+
+    def directRemove(self, k: object) -> None:
+        "Directly remove an element from the stack ignoring the order"
+        self.board.remove(self.i, self.j, k)
+
+    def reset(self):
+        "Hard reset stack to empty"
+        self.board.clear(self.i, self.j)
+
+
+class ArrayRow():
+    """A row of `ArrayCell` views"""
+    __slots__ = ("board", "i")
+
+    def __init__(self, board: ArrayBoard, i: int) -> None:
+        self.board, self.i = board, i
+
+    def __len__(self):
+        return self.board.N
+
+    def __getitem__(self, j: int) -> ArrayCell:
+        if not -self.board.N <= j < self.board.N: raise IndexError(j)
+        return ArrayCell(self.board, self.i, j % self.board.N)
+
+    def __iter__(self) -> Iterator[ArrayCell]:
+        return (ArrayCell(self.board, self.i, j) for j in range(self.board.N))
+
+
+class ArrayGrid():
+    """`Purge.map` compatible 2D view over an `ArrayBoard`"""
+    __slots__ = ("board",)
+
+    def __init__(self, board: ArrayBoard) -> None:
+        self.board = board
+
+    def __len__(self):
+        return self.board.M
+
+    def __getitem__(self, i: int) -> ArrayRow:
+        if not -self.board.M <= i < self.board.M: raise IndexError(i)
+        return ArrayRow(self.board, i % self.board.M)
+
+    def __iter__(self) -> Iterator[ArrayRow]:
+        return (ArrayRow(self.board, i) for i in range(self.board.M))
@@ -0,0 +1,194 @@
+"""
+Benchmarks of the main Purge code paths over a grid of board sizes.
+
+Every scenario is a seeded game, so two runs measure the same work. Each
+operation is timed a few times (best and median wall time are kept) and run
+once more under tracemalloc for its peak memory. Results are saved as JSON and
+can be compared against a stored baseline:
+
+    python Benchmark.py -o baseline.json
+    python Benchmark.py -b baseline.json --tolerance 0.25
+"""
+from __future__ import annotations
+import os, sys, argparse, time, json, io, platform, statistics, tracemalloc
+from typing import *
+from Purge import Purge
+from Renderer import Renderer
+from Utils import *
+from Characters import *
+from Forecast import SpreadModel
+
+
+class Scenario(NamedTuple):
+    """A seeded game to run the operations on"""
+    h: int
+    w: int
+    city_count: int
+    city_size: int
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.h}x{self.w}_c{self.city_count}x{self.city_size}"
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(10, 10, 2, 5),
+    Scenario(25, 25, 4, 20),
+    Scenario(50, 50, 6, 60),
+    Scenario(100, 100, 12, 120),
+    Scenario(200, 200, 25, 250),
+    Scenario(500, 500, 60, 600),
+]
+"Default scenarios, from 10x10 to 500x500"
+
+ROUNDS = 10
+"Rounds played by the `roundEnd` and `forecast` operations"
+FUTURES = 256
+"Futures played at once by the `forecast` operation"
+
+
+# =============================
+# Operations
+# =============================
+# ◼︎ an operation gets the scenario and a fresh game, it returns a callable doing the measured work
+def _generate(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    return lambda: Purge(sc.h, sc.w, sc.city_count, sc.city_size, array_board=arrayBoard, seed=sc.seed)
+
+def _astar(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    first, last = purge.cities[0], purge.cities[-1]
+    start, end = min(first.edgePositions), max(last.edgePositions)
+    blocked = lambda i, j: isType(purge.peekCell(i, j), [City, Doctor, Knight, Disease])
+    return lambda: PathFinder.astar(purge.map, start, end, blocked)
+
+def _roundEnd(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    def run():
+        game = Purge(sc.h, sc.w, sc.city_count, sc.city_size, array_board=arrayBoard, seed=sc.seed)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            if game.roundEnd(): break
+        return time.perf_counter() - start
+    return run
+
+def _clone(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    return lambda: purge.clone()
+
+def _forecast(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    model = SpreadModel(purge)
+    return lambda: model.forecast(purge, ROUNDS, FUTURES, seed=sc.seed)
+
+def _dfsUnion(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    return lambda: DisjointSet.Merger.dfsUnion(purge.map, purge.cities)
+
+def _showMap(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    renderer = Renderer(purge, io.StringIO(), diff=False)
+    return lambda: renderer.draw()
+
+def _showMapDiff(sc: Scenario, purge: Purge, arrayBoard: bool) -> Callable[[], Any]:
+    renderer = Renderer(purge, io.StringIO(), diff=True)
+    def run():
+        renderer.draw(full=True)
+        purge.roundEnd()
+        return renderer.draw()
+    return run
+
+
+OPERATIONS: Dict[str, Callable[[Scenario, Purge, bool], Callable[[], Any]]] = {
+    "generate": _generate,
+    "astar": _astar,
+    "roundEnd": _roundEnd,
+    "clone": _clone,
+    "forecast": _forecast,
+    "dfsUnion": _dfsUnion,
+    "showMap": _showMap,
+    "showMapDiff": _showMapDiff,
+}
+"""Benchmarked operations by name. `roundEnd` returns its own timing so the
+game creation it needs is not timed, its peak memory does include it"""
+
+
+# =============================
+# Running
+# =============================
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Time `fn` `repeat` times then run it once under tracemalloc
+    ### return
+        - best and median seconds, peak traced bytes
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn()
+        elapsed = time.perf_counter() - start
+        times.append(res if isinstance(res, float) else elapsed)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"best": min(times), "median": statistics.median(times), "peakBytes": peak}
+
+
+def run(scenarios: List[Scenario]=SCENARIOS, operations: List[str]=None, repeat: int=3,
+        arrayBoard: bool=False, verbose: bool=True) -> Dict[str, Any]:
+    """Run `operations` (all of `OPERATIONS` by default) on every scenario
+    ### return
+        - `{"meta": {...}, "results": {"<scenario>/<operation>": measurement}}`
+    """
+    operations = operations or list(OPERATIONS)
+    results = {}
+    for sc in scenarios:
+        for op in operations:
+            purge = Purge(sc.h, sc.w, sc.city_count, sc.city_size, array_board=arrayBoard, seed=sc.seed)
+            results[f"{sc.name}/{op}"] = res = measure(OPERATIONS[op](sc, purge, arrayBoard), repeat)
+            if verbose:
+                print(f"{sc.name:<24}{op:<14}{res['best']*1000:>11.3f} ms {res['peakBytes']/1024:>11.1f} KiB", flush=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arrayBoard": arrayBoard,
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float=0.25,
+            minDelta: float=0.001) -> List[str]:
+    """Find the operations slower than the baseline by more than `tolerance`
+        (a ratio of the baseline's best time) and by more than `minDelta` 
+        seconds, only keys found in both are compared
+    ### return
+        - a line describing each regression
+    """
+    regressions = []
+    for key, res in current["results"].items():
+        if (base:= baseline["results"].get(key)) is None: continue
+        if res["best"] > base["best"] * (1 + tolerance) and res["best"] - base["best"] > minDelta:
+            regressions.append(f"{key}: {base['best']*1000:.3f} ms -> {res['best']*1000:.3f} ms "
+                               f"(+{(res['best'] / base['best'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge benchmarks")
+    parser.add_argument("-o", "--out", type=str, metavar="", default=None, help="Save the results to this JSON file")
+    parser.add_argument("-b", "--baseline", type=str, metavar="", default=None, help="Compare against this results file")
+    parser.add_argument("--tolerance", type=float, metavar="", default=0.25, help="Allowed slowdown ratio before flagging")
+    parser.add_argument("--min_delta", type=float, metavar="", default=0.001, help="Ignore slowdowns below this many seconds")
+    parser.add_argument("-r", "--repeat", type=int, metavar="", default=3, help="Timed runs per operation")
+    parser.add_argument("--max_size", type=int, metavar="", default=500, help="Skip scenarios larger than this height")
+    parser.add_argument("--ops", choices=OPERATIONS, nargs="+", default=None, help="Operations to run")
+    parser.add_argument("--array_board", type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="Run on ArrayBoard maps")
+    args = parser.parse_args()
+
+    report = run([sc for sc in SCENARIOS if sc.h <= args.max_size], args.ops, args.repeat, args.array_board)
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f: regressions = compare(report, json.load(f), args.tolerance, args.min_delta)
+        for line in regressions: print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
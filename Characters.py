@@ -9,6 +9,8 @@ if TYPE_CHECKING:
     from Purge import Purge, Cell
 
 class PawnBase():
+    __slots__ = ("root", "purgeRef")
+
     def __init__(self, purge: Purge, pos: Tuple[int, int]) -> None:
         self.root = pos
         "The current (center) position of this pawn"
@@ -24,6 +26,11 @@ class City(PawnBase):
     This class represents a single city and contains functions related to 
     modifying or getting the info of that city.
     """
+    __slots__ = ("cityName", "cells_pos", "roadsTo", "gates", "frontier", "infectedCnt", "_edges", "_border")
+
+    OVERRUN_RATIO = 0.6
+    "A city is overrun once its infected percentage is above this"
+
     def __init__(self, purge: Purge, rx: int, ry: int, cityName="Default CityName") -> None:
         super().__init__(purge, (rx, ry))
         self.cityName = cityName
@@ -34,6 +41,16 @@ class City(PawnBase):
         """A dict of roads that connect to other cities
         - Key = start_pos, Value = [(end_position, path)]
         """
+        self.gates: Set[Tuple[int, int]] = set()
+        "Positions of the gates of this city, the keys of `roadsTo`"
+        self._edges: Tuple[Tuple[int, int], ...] = None
+        "Cached `edgePositions`, `None` until computed"
+        self._border: Tuple[Tuple[int, int], ...] = None
+        "Cached `borderPositions`, `None` until computed"
+        self.frontier: IndexedSet = IndexedSet()
+        "Diseases at the edge of each disease blob, kept up to date by `updateFrontier` (left empty on an `ArrayBoard`)"
+        self.infectedCnt = 0
+        "Number of diseases in the city, kept up to date by `Purge`"
 
         self.addCellPos(self.root)
 
@@ -45,83 +62,180 @@ class City(PawnBase):
 
 
     @property
-    def edgePositions(self) -> List[Cell]:
-        """get the positions of the edges of this city"""
-        M, N = self.purgeRef.M, self.purgeRef.N
+    def edgePositions(self) -> Tuple[Tuple[int, int], ...]:
+        """get the positions of the edges of this city, a cell appears once for 
+            each outside square it faces (computed once, see `freezeGeometry`)
+        """
+        if self._edges is None: self._computeGeometry()
+        return self._edges
+
+    @property
+    def borderPositions(self) -> Tuple[Tuple[int, int], ...]:
+        """get the squares outside of this city that face its edges"""
+        if self._border is None: self._computeGeometry()
+        return self._border
+
+    @property
+    def gatePositions(self) -> Set[Tuple[int, int]]:
+        """Return the positions of all the gates in this city"""
+        return self.gates
+
+    def _computeGeometry(self) -> None:
+        purge, adjacent = self.purgeRef, self.purgeRef.stencils.adjacent
         candidates = DefaultDict(list)
 
-        for i, j in self.cells_pos:
-            for di, dj in DIRECTIONS_ADJ:
-                if not inBounds((ni:=i+di), (nj:=j+dj), M, N) or\
-                   isType(self.purgeRef.peekCell(ni, nj), City): continue
-                candidates[(ni,nj)].append((i,j))
+        for pos in self.cells_pos:
+            for nei in adjacent(*pos):
+                if isType(purge.peekCellBase(*nei), City): continue
+                candidates[nei].append(pos)
         
-        res = []
-        for ls in candidates.values():
+        edges, border = [], []
+        for pos, ls in candidates.items():
             if len(ls) > 3: continue
-            for v in ls:
-                res.append(v)
-        return res
+            border.append(pos)
+            edges.extend(ls)
+        self._edges, self._border = tuple(edges), tuple(border)
 
-    @property
-    def gatePositions(self) -> List[Tuple[int, int]]:
-        """Return the positions of all the gates in this city"""
-        return self.roadsTo.keys()
+    def freezeGeometry(self) -> None:
+        """Compute the edges and border once and freeze the cell positions
+            Should be called once the map generation is done
+        """
+        self.cells_pos = frozenset(self.cells_pos)
+        self._computeGeometry()
+
+    def invalidateGeometry(self) -> None:
+        "Drop the cached geometry and allow editing the cell positions again"
+        self.cells_pos = set(self.cells_pos)
+        self._edges = self._border = None
+
+    def copyFor(self, purge: Purge) -> City:
+        """This city in `purge`, a copy of its game. The geometry (cells, gates,
+            roads) is shared and must not be edited anymore, the frontier is left
+            empty for the copy to fill in
+        """
+        city = City.__new__(City)
+        city.root, city.purgeRef, city.cityName = self.root, purge, self.cityName
+        city.cells_pos, city.roadsTo, city.gates = self.cells_pos, self.roadsTo, self.gates
+        city._edges, city._border = self._edges, self._border
+        city.frontier, city.infectedCnt = IndexedSet(), self.infectedCnt
+        return city
+
+    def addRoad(self, start: Tuple[int, int], end: Tuple[int, int], path: List[Tuple[int, int]]) -> None:
+        "Add a road from the gate at `start` of this city to `end` in another city"
+        self.roadsTo[start].append((end, path))
+        self.gates.add(start)
 
     @property
     def edgeDiseases(self) -> List[Disease]:
-        """Get all the diseases that are at the edge of each disease blob"""
-        purge, M, N, res = self.purgeRef, self.purgeRef.M, self.purgeRef.N, []
+        """Get all the diseases that are at the edge of each disease blob, in row-major
+            order so both kinds of board pick the same ones. Read from the frontier, or
+            from the layers of an `ArrayBoard`
+        """
+        if (board:= self.purgeRef.board): return board.edgeDiseases(self)
+        return sorted(self.frontier, key=lambda d: d.root)
+
+    def scanEdgeDiseases(self) -> List[Disease]:
+        """Find the edge diseases by scanning the whole city (slow, see `edgeDiseases`)"""
+        purge, res = self.purgeRef, []
         for pos in self.cells_pos:
             topMostObj = purge.peekCell(*pos)
             botMostObj = purge.peekCellBase(*pos)
             if isType(topMostObj, Disease):
-                for di, dj in DIRECTIONS_ADJ:
-                    if inBounds((ni:=pos[0]+di), (nj:=pos[1]+dj), M, N) and\
-                        (isType(purge.peekCell(ni, nj), City) or 
+                for ni, nj in purge.stencils.adjacent(*pos):
+                    if (isType(purge.peekCell(ni, nj), City) or 
                          (isType(purge.peekCell(ni, nj), Road) and botMostObj.isGate(*pos) )
                         ):
                         res.append(topMostObj)
                         break
         return res
 
+    def isEdge(self, pos: Tuple[int, int]) -> bool:
+        """Check if the position holds a disease at the edge of its blob: next to an
+            uninfected city cell, or at a gate next to a road
+        """
+        purge = self.purgeRef
+        if not isType(purge.peekCell(*pos), Disease): return False
+        isGate = self.isGate(*pos)
+        for ni, nj in purge.stencils.adjacent(*pos):
+            neiObj = purge.peekCell(ni, nj)
+            if isType(neiObj, City) or (isGate and isType(neiObj, Road)): return True
+        return False
+
+    def updateFrontier(self, pos: Tuple[int, int]) -> None:
+        """Add or remove the disease at the position from the frontier
+            Should be called when the position or one of its neighbors changed
+        """
+        diseaseSeed: Disease = self.purgeRef.searchMapAtPos(Disease, *pos)
+        if diseaseSeed is None: return
+        if self.isEdge(pos): self.frontier.add(diseaseSeed)
+        else: self.frontier.discard(diseaseSeed)
+
+    def rebuildFrontier(self) -> None:
+        "Recompute the frontier from a full scan of the city"
+        self.frontier = IndexedSet(self.scanEdgeDiseases())
+
     def addCellPos(self, pos: Tuple[int, int]) -> None:
         """ Add a coordinate to the cell position set """
         self.cells_pos.add(pos)
+        self._edges = self._border = None
 
     def isGate(self, i: int, j: int) -> bool:
         """Check if the position is a gate of this city"""
-        return (i,j) in self.roadsTo.keys()
+        return (i,j) in self.gates
 
     def getInfectPercentage(self) -> float:
-        diseaseCnt = 0
-        for pos in self.cells_pos:
-            topMostObj = self.purgeRef.peekCell(*pos)
-            if isType(topMostObj, Disease):
-                diseaseCnt += 1
-        return round(diseaseCnt / len(self.cells_pos), 2)
+        return round(self.infectedCnt / len(self.cells_pos), 2)
+
+    @property
+    def isOverrun(self) -> bool:
+        return self.getInfectPercentage() > self.OVERRUN_RATIO
 
 # =============================
 # User Character Classes
 # =============================
-class Tree(PawnBase):
-    def __init__(self, purge: Purge) -> None:
-        super().__init__(purge, (-1, -1))
+class Terrain(PawnBase):
+    """Immutable pawn without position or game, a single instance of each 
+        subclass is shared by every square of that kind (flyweight)
+    """
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        object.__setattr__(self, "root", (-1, -1))
+        object.__setattr__(self, "purgeRef", None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+
+class Tree(Terrain):
+    __slots__ = ()
+
 
+class Road(Terrain):
+    __slots__ = ()
 
-class Road(PawnBase):
-    def __init__(self, purge: Purge) -> None:
-        super().__init__(purge, (-1, -1))
+
+TREE = Tree()
+"The tree shared by all tree squares"
+ROAD = Road()
+"The road shared by all road squares"
 
 
 class MasterPawn(PawnBase):
+    __slots__ = ()
+
     def __init__(self, purge: Purge, pos: Tuple[int, int]) -> None:
         super().__init__(purge, pos)
 
-    def moveTo(self, pos: Tuple[int, int]) -> bool:
+    def moveTo(self, pos: Tuple[int, int], roadIdx: int=None) -> bool:
         """Move master character to the specified position
+        ## params
+            - `roadIdx`: which road to take when leaving a gate with several 
+              roads, asked on the terminal if not provided
         ### return
             - `bool`: `True` if moving was successfuly, `False` if not
+        ### raise
+            - `RuntimeError`: `roadIdx` is not one of the gate's roads
         """
         purge, map = self.purgeRef, self.purgeRef.map
         if not inBounds(*pos, self.purgeRef.M, self.purgeRef.N): return False
@@ -130,32 +244,36 @@ class MasterPawn(PawnBase):
         if purge.peekCellBase(*self.root).isGate(*self.root) and\
             isType(purge.peekCell(*pos), Road):
             gate: City = purge.peekCellBase(*self.root)
-            if len(gate.roadsTo[self.root]) == 1:
-                nextPos = gate.roadsTo[self.root][0][0]
-                purge.moveTopElemOnMapTo(self.root, nextPos)
-                self.root = nextPos
-            else:
+            roads = gate.roadsTo[self.root]
+            if roadIdx is not None and not 0 <= roadIdx < len(roads):
+                raise RuntimeError(f"No road {roadIdx} from the gate at {self.root}")
+            if roadIdx is None and len(roads) > 1:
                 print("Pick a destination:")
-                for i, endSeq in enumerate(gate.roadsTo[self.root]):
+                for i, endSeq in enumerate(roads):
                     print(i, endSeq[0])
-                while not 0 <= (val:= int(input())) < len(gate.roadsTo[self.root]):
+                while not 0 <= (roadIdx:= int(input())) < len(roads):
                     continue
-                nextPos = gate.roadsTo[self.root][val][0]
-                print(nextPos)
-                purge.moveTopElemOnMapTo(self.root, nextPos)
-                self.root = nextPos
+                print(roads[roadIdx][0])
+            nextPos = roads[roadIdx or 0][0]
+            # ◼︎ like a step in a city, the gate at the other end must be free
+            if type(purge.peekCell(*nextPos)) != City: return False
+            if purge.journal: purge.journal.record("moveTo", self, pos, roadIdx)
+            purge.moveTopElemOnMapTo(self.root, nextPos)
+            self.root = nextPos
             return True
         else:
             if type(map[pos[0]][pos[1]].peek()) == City:
+                if purge.journal: purge.journal.record("moveTo", self, pos)
                 purge.moveTopElemOnMapTo(self.root, pos)
                 self.root = pos
                 return True
             else: return False
 
-    def moveDirectionalByOne(self, val: Literal["w","s","a","d"]) -> bool:
+    def moveDirectionalByOne(self, val: Literal["w","s","a","d"], roadIdx: int=None) -> bool:
         """Move directionally by one cell
         ## param
             - `dir`: 1: left, 2: up, 3 : right, 4: down
+            - `roadIdx`: see `moveTo`
         """
         val = val.lower()
         diff = None
@@ -163,68 +281,80 @@ class MasterPawn(PawnBase):
             if val == ch: diff = dv
         if diff == None: raise RuntimeError("Incorrect val for directional movement")
         newPos = tuple(map(sum, zip(self.root, diff)) )
-        self.moveTo(newPos)
+        return self.moveTo(newPos, roadIdx)
 
 class MasterPawnSecondary(PawnBase):
+    __slots__ = ("delta",)
+
     def __init__(self, purge: Purge, master_pos: Tuple[int, int], pos: Tuple[int, int]) -> None:
         super().__init__(purge, pos)
         self.delta = tuple(map(lambda i, j: i - j, master_pos, pos))
 
 
 class Doctor(MasterPawn):
+    __slots__ = ()
+
     def __init__(self, purge: Purge, pos: Tuple[int, int]) -> None:
         super().__init__(purge, pos)
 
     def cureCross(self):
         purge, M, N = self.purgeRef, self.purgeRef.M, self.purgeRef.N
+        if purge.journal: purge.journal.record("cureCross", self)
         
         def checkAndRemove(k, isVertical):
             for v in range(k):
                 checkPos = (v, self.root[1]) if isVertical else (self.root[0], v)
                 if not purge.peekCellBase(*checkPos) is purge.peekCellBase(*self.root): continue
                    
-                diseaseSeed: Disease = purge.searchMapAtPos(Disease, *checkPos)
+                diseaseSeed: Disease = purge.diseaseSeeds.at(checkPos)
                 if diseaseSeed == None: continue
 
-                purge.diseaseSeeds.remove(diseaseSeed)
                 purge.removeElemFromCell(diseaseSeed, *checkPos)
                 purge.map[checkPos[0]][checkPos[1]].noUpdateCnt += 2
         checkAndRemove(M, isVertical=True)
         checkAndRemove(N, isVertical=False)
             
+    def nursePositions(self) -> List[Tuple[int, int]]:
+        "Adjacent positions a nurse can be placed at"
+        purge = self.purgeRef
+        return [pos for pos in purge.stencils.adjacent(*self.root) if isType(purge.peekCell(*pos), City)]
+
+    def placeNurseAt(self, nursePos: Tuple[int, int]) -> bool:
+        """Place a nurse without asking on the terminal
+        ### return
+            - `bool`: `True` if the nurse was placed
+        """
+        if nursePos not in self.nursePositions(): return False
+        if self.purgeRef.journal: self.purgeRef.journal.record("placeNurseAt", self, nursePos)
+        nurse = Nurse(self.purgeRef, self.root, nursePos)
+        self.purgeRef.putOnMap(nursePos, nurse)
+        self.purgeRef.nurses.append(nurse)
+        return True
+
     def placeNurse(self):
         print("pick a direction to place nurse:")
         selectionDict = {}
-        i = 0
-        for dir in DIRECTIONS_ADJ:
-            newPos = tuple(map(sum, zip(self.root, dir)))
-            if isType(self.purgeRef.peekCell(*newPos), City):
-                print(f"{i}.", newPos)
-                selectionDict[str(i)] = newPos
-                i += 1
+        for i, newPos in enumerate(self.nursePositions()):
+            print(f"{i}.", newPos)
+            selectionDict[str(i)] = newPos
         
         selection = input("Number: ")
         if selection in selectionDict:
-            nursePos = selectionDict[selection]
-            if (self.purgeRef.peekCellBase(*nursePos), City):
-                nurse = Nurse(self.purgeRef, self.root, nursePos)
-                self.purgeRef.putOnMap(nursePos, nurse)
-                self.purgeRef.nurses.append(nurse)
+            self.placeNurseAt(selectionDict[selection])
 
 class Nurse(MasterPawnSecondary):
+    __slots__ = ("counter",)
+
     def __init__(self, purge: Purge, master_pos: Tuple[int, int], pos: Tuple[int, int]) -> None:
         super().__init__(purge, master_pos, pos)
         self.counter = 2
 
     def turnEnd(self):
         purge = self.purgeRef
-        for dir in DIRECTIONS_ALL:
-            curePos = tuple(map(sum, zip(self.root, dir)))
-            if inBounds(*curePos, self.purgeRef.M, self.purgeRef.N) and\
-                isType(self.purgeRef.peekCellBase(*curePos), City):
-                diseaseSeed: Disease = purge.searchMapAtPos(Disease, *curePos)
+        for curePos in purge.stencils.around(*self.root):
+            if isType(purge.peekCellBase(*curePos), City):
+                diseaseSeed: Disease = purge.diseaseSeeds.at(curePos)
                 if diseaseSeed == None: continue
-                purge.diseaseSeeds.remove(diseaseSeed)
                 purge.removeElemFromCell(diseaseSeed, *curePos)
                 purge.map[curePos[0]][curePos[1]].noUpdateCnt += 2
         self.counter -= 1
@@ -235,32 +365,41 @@ class Nurse(MasterPawnSecondary):
 
 
 class Knight(MasterPawn):
+    __slots__ = ()
+
     def __init__(self, purge: Purge, pos: Tuple[int, int]) -> None:
         super().__init__(purge, pos)
 
+    def disinfectantPositions(self) -> List[Tuple[int, int]]:
+        "Positions two cells away the disinfectant can be thrown at"
+        return list(self.purgeRef.stencils.reach(*self.root))
+
+    def throwDisinfectantAt(self, kPos: Tuple[int, int]) -> None:
+        """Throw the disinfectant at `kPos` without asking on the terminal,
+            the city cells of the 3x3 square around it cannot be infected for 4 rounds
+        ### raise
+            - `RuntimeError`: `kPos` is not one of `disinfectantPositions`
+        """
+        purge = self.purgeRef
+        if kPos not in purge.stencils.reach(*self.root):
+            raise RuntimeError(f"The knight at {self.root} cannot throw the disinfectant at {kPos}")
+        if purge.journal: purge.journal.record("throwDisinfectantAt", self, kPos)
+        for ni, nj in purge.stencils.area(*kPos):
+            if type(purge.peekCellBase(ni, nj)) == City:
+                purge.map[ni][nj].noUpdateCnt = 4
+
     def throwDisinfectant(self):
-        purge, M, N = self.purgeRef, self.purgeRef.M, self.purgeRef.N
         selectionDict = {}
-        i = 0
         try:
             print("Pick a position to throw the disinfectant, it will effect the adjacent 9 cells.")
-            for di, dj in DIRECTIONS_ALL:
-                centPos = tuple(map(sum, zip(self.root, (di*2, dj*2))) )
-                if inBounds(*centPos, M, N):
-                    selectionDict[str(i)] = centPos
-                    print(f"{i}.", centPos)
-                    i += 1
+            for i, centPos in enumerate(self.disinfectantPositions()):
+                selectionDict[str(i)] = centPos
+                print(f"{i}.", centPos)
             
             while True:
                 selection = input("Number: ")
                 if selection in selectionDict.keys():
-                    kPos = selectionDict[selection]
-                    for DIFF in DIRECTIONS_ALL:
-                        neiPos = tuple(map(sum, zip(kPos, DIFF)))
-                        if inBounds(*neiPos, M, N) and type(purge.peekCellBase(*neiPos)) == City:
-                            purge.map[neiPos[0]][neiPos[1]].noUpdateCnt = 4
-                    if inBounds(*kPos, M, N) and type(purge.peekCellBase(*kPos)) == City:
-                        purge.map[kPos[0]][kPos[1]].noUpdateCnt = 4
+                    self.throwDisinfectantAt(selectionDict[selection])
                     break
         except KeyboardInterrupt:
             sys.exit()
@@ -269,6 +408,7 @@ class Knight(MasterPawn):
             pass
 
     def switchPositionWithDoctor(self):
+        if self.purgeRef.journal: self.purgeRef.journal.record("switchPositionWithDoctor", self)
         knightPos = copy.deepcopy(self.root)
         docPos = copy.deepcopy(self.purgeRef.doctor.root)
         self.purgeRef.popFromMap(docPos)
@@ -280,26 +420,75 @@ class Knight(MasterPawn):
 
 
 class Disease(PawnBase):
+    __slots__ = ()
+
     def __init__(self, purge: Purge, pos: Tuple[int, int]) -> None:
         super().__init__(purge, pos)
 
     def growToAdjacent(self) -> None:
         purge = self.purgeRef
         # ◼︎ grow to adjacent
-        for i, (dx, dy) in enumerate(DIRECTIONS_ADJ):
-            newPos = (self.root[0]+dx, self.root[1]+dy)
-            kCell = purge.map[newPos[0]][newPos[1]]
-            if isType(purge.peekCell(*newPos), City) and kCell.canBeUpdate:
-                purge.putOnMap(newPos, (dis:= Disease(purge, newPos)) )
-                purge.diseaseSeeds.append(dis)
+        for newPos in purge.stencils.adjacent(*self.root):
+            if isType(purge.peekCell(*newPos), City) and (kCell:= purge.map[newPos[0]][newPos[1]]).canBeUpdate:
+                purge.putOnMap(newPos, Disease(purge, newPos))
                 kCell.noUpdateCnt += 5
 
         # ◼︎ grow to another city
         city: City = purge.searchMapAtPos(City, *self.root)
         if self.root in city.gatePositions:
-            newPos = random.choice(city.roadsTo[self.root])[0]
-            kCell = purge.map[newPos[0]][newPos[1]]
-            if isType(purge.peekCell(*newPos), City) and kCell.canBeUpdate:
-                purge.putOnMap(newPos, (dis:= Disease(purge, newPos)) )
-                purge.diseaseSeeds.append(dis)
-                kCell.noUpdateCnt += 5
\ No newline at end of file
+            newPos = purge.spreadRng.choice(city.roadsTo[self.root])[0]
+            if isType(purge.peekCell(*newPos), City) and (kCell:= purge.map[newPos[0]][newPos[1]]).canBeUpdate:
+                purge.putOnMap(newPos, Disease(purge, newPos))
+                kCell.noUpdateCnt += 5
+
+
+class DiseaseRegistry():
+    """
+    All the diseases of a game keyed by their position, with a per-city 
+    breakdown. Insert, remove and lookup are O(1), and iterating follows the 
+    insertion order so seeded games stay reproducible.
+    """
+    __slots__ = ("byPos", "byCity")
+
+    def __init__(self) -> None:
+        self.byPos: Dict[Tuple[int, int], Disease] = {}
+        "Disease at each infected position"
+        self.byCity: Dict[City, Dict[Tuple[int, int], Disease]] = DefaultDict(dict)
+        "Diseases of each city, keyed by position"
+
+    def add(self, disease: Disease, city: City) -> None:
+        "Register a disease placed in `city`"
+        self.byPos[disease.root] = disease
+        self.byCity[city][disease.root] = disease
+
+    def remove(self, disease: Disease, city: City) -> None:
+        "Unregister a disease taken off `city`, raise `KeyError` if it is not registered"
+        if self.byPos.get(disease.root) is not disease: raise KeyError(disease.root)
+        del self.byPos[disease.root]
+        del self.byCity[city][disease.root]
+
+    def clear(self) -> None:
+        self.byPos.clear()
+        self.byCity.clear()
+
+    def at(self, pos: Tuple[int, int]) -> Union[Disease, None]:
+        "Disease at the position, if any"
+        return self.byPos.get(pos)
+
+    def inCity(self, city: City) -> Dict[Tuple[int, int], Disease]:
+        "Diseases of the city keyed by position"
+        return self.byCity.get(city, {})
+
+    @property
+    def positions(self) -> KeysView[Tuple[int, int]]:
+        "Set-like view of the infected positions"
+        return self.byPos.keys()
+
+    def __len__(self) -> int:
+        return len(self.byPos)
+
+    def __iter__(self) -> Iterator[Disease]:
+        return iter(self.byPos.values())
+
+    def __contains__(self, disease: Disease) -> bool:
+        return self.byPos.get(disease.root) is disease
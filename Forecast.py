@@ -0,0 +1,253 @@
+"""
+Batched Monte Carlo forecast of the disease spreading.
+
+The city squares of a game are numbered city by city and the spreading rules
+of `Purge.roundEnd` are rewritten as array operations over a `(futures,
+squares)` batch, so hundreds of futures advance together one round at a time:
+
+- every city with an edge disease (`City.edgeDiseases`) picks one at random
+- the picked diseases grow to their free adjacent squares whose timer ran out,
+  and from a gate along one of its roads at random (`Disease.growToAdjacent`)
+- the clock moves and the nurses cure around them (`Nurse.turnEnd`)
+
+The players are assumed to stay put and do nothing, so the forecast says what
+happens if nobody acts. Unlike `Purge.roundEnd`, where each city picks after
+the growth of the cities before it, every city picks among the edge diseases
+of the start of the round, so futures follow the same odds without replaying
+the game's random streams.
+
+    model = SpreadModel(purge)
+    fc = model.forecast(purge, rounds=10, futures=512)
+    fc.overrunWithin(10) # {city: probability}
+
+Requires numpy.
+"""
+from __future__ import annotations
+import argparse, time
+from typing import *
+from Purge import Purge
+from Utils import *
+from Characters import *
+from ArrayBoard import np
+
+SPREAD_TIMER = 5
+"Rounds a newly infected square is protected for, see `Disease.growToAdjacent`"
+CURE_TIMER = 2
+"Rounds added to the timer of a square cured by a nurse, see `Nurse.turnEnd`"
+
+
+class SpreadForecast(NamedTuple):
+    """Outcome of a batch of futures, row `r` of each array is the state after `r` more rounds"""
+    cities: List[City]
+    futures: int
+    overrunProb: np.ndarray
+    "(rounds + 1, cities) share of the futures in which the city was overrun by then"
+    infected: np.ndarray
+    "(rounds + 1, cities) mean infected share of each city"
+    lossProb: np.ndarray
+    "(rounds + 1,) share of the futures lost by then, every city overrun at once"
+    clearedProb: np.ndarray
+    "(rounds + 1,) share of the futures without any disease left by then"
+
+    @property
+    def rounds(self) -> int:
+        return len(self.lossProb) - 1
+
+    def overrunWithin(self, k: int=None) -> Dict[City, float]:
+        "Chance of each city to be overrun within `k` rounds (all the forecast rounds by default)"
+        row = self.overrunProb[self.rounds if k is None else k]
+        return {city: float(p) for city, p in zip(self.cities, row)}
+
+
+class SpreadModel():
+    """
+    The city squares of a game encoded as arrays. The cities, roads and gates
+    do not change once a map is generated, so a model is built once per game
+    and `forecast` only reads the diseases, timers and pawns of the moment.
+    """
+    def __init__(self, purge: Purge) -> None:
+        if np is None:
+            raise RuntimeError("The spread forecast requires numpy to be installed")
+        M, N, cities = purge.M, purge.N, purge.cities
+        self.cities = cities
+        self.M, self.N = M, N
+        sizes = [len(city.cells_pos) for city in cities]
+        self.sizes = np.array(sizes, dtype=np.int64)
+        "Squares of each city"
+        self.starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        "First square number of each city, a city's squares are numbered in a row"
+        S = self.size = sum(sizes)
+        "Number of city squares, the squares of the batch"
+
+        cells = [pos for city in cities for pos in sorted(city.cells_pos)]
+        self.rows = np.array([i for i, _ in cells], dtype=np.int64)
+        self.cols = np.array([j for _, j in cells], dtype=np.int64)
+        self.squareAt = np.full((M, N), -1, dtype=np.int64)
+        "Square number of each city square of the map, -1 elsewhere"
+        self.squareAt[self.rows, self.cols] = np.arange(S)
+
+        # ◼︎ adjacent city squares, `S` (a square that is never free) when there is none
+        self.adjacent = np.full((S, 4), S, dtype=np.int64)
+        "Number of the 4 adjacent squares of each city square"
+        self.roadNext: List[Tuple[int, Tuple[int, int]]] = []
+        "(square, road position) of each road square next to a city square"
+        for d, (di, dj) in enumerate(DIRECTIONS_ADJ):
+            ni, nj = self.rows + di, self.cols + dj
+            inside = (ni >= 0) & (ni < M) & (nj >= 0) & (nj < N)
+            nei = np.full(S, -1, dtype=np.int64)
+            nei[inside] = self.squareAt[ni[inside], nj[inside]]
+            self.adjacent[nei >= 0, d] = nei[nei >= 0]
+            for k in np.flatnonzero(inside & (nei < 0)):
+                if isType(purge.peekCellBase(int(ni[k]), int(nj[k])), Road):
+                    self.roadNext.append((int(k), (int(ni[k]), int(nj[k]))))
+
+        # ◼︎ gates and the far end of each of their roads
+        gates = [(city, pos) for city in cities for pos in sorted(city.gatePositions)]
+        self.gateOf = np.full(S, -1, dtype=np.int64)
+        "Gate number of each square, -1 if it is not a gate"
+        self.roadCount = np.array([len(city.roadsTo[pos]) for city, pos in gates], dtype=np.int64)
+        self.roadEnds = np.zeros((len(gates), max(self.roadCount, default=1)), dtype=np.int64)
+        "Square number of the far end of each road of a gate, padded with 0"
+        for g, (city, pos) in enumerate(gates):
+            self.gateOf[self.squareAt[pos]] = g
+            for r, (end, _) in enumerate(city.roadsTo[pos]):
+                self.roadEnds[g, r] = self.squareAt[end]
+
+    def _square(self, pos: Tuple[int, int]) -> int:
+        return int(self.squareAt[pos])
+
+    def state(self, purge: Purge) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Tuple[np.ndarray, int, int]]]:
+        """The dynamic state of `purge` over the city squares
+        ### return
+            - infected squares, timer expiry rounds, squares covered by the doctor
+              or the knight, gates next to a free road square, (cured squares,
+              square, counter) of each nurse
+        """
+        disease = np.zeros(self.size, dtype=bool)
+        for pos in purge.diseaseSeeds.positions: disease[self._square(pos)] = True
+        if purge.board:
+            expiry = purge.board.timer[self.rows, self.cols].astype(np.int64)
+        else:
+            expiry = np.array([purge.map[i][j].expiry for i, j in zip(self.rows.tolist(), self.cols.tolist())],
+                              dtype=np.int64)
+        pawns = np.zeros(self.size, dtype=bool)
+        for pawn in (purge.doctor, purge.knight):
+            if (k:= self._square(pawn.root)) >= 0: pawns[k] = True
+        # ◼︎ the pawns do not move, so a gate next to a free road square stays on the frontier while infected
+        taken = {pawn.root for pawn in (purge.doctor, purge.knight, *purge.nurses) if pawn is not None}
+        roadEdge = np.zeros(self.size, dtype=bool)
+        for k, pos in self.roadNext:
+            if self.gateOf[k] >= 0 and pos not in taken: roadEdge[k] = True
+
+        nurses = []
+        for nurse in purge.nurses:
+            if nurse is None: continue
+            around = [self._square(pos) for pos in purge.stencils.around(*nurse.root)]
+            nurses.append((np.array([k for k in around if k >= 0], dtype=np.int64),
+                           self._square(nurse.root), nurse.counter))
+        return disease, expiry, pawns, roadEdge, nurses
+
+    def forecast(self, purge: Purge, rounds: int=10, futures: int=256, seed: int=None) -> SpreadForecast:
+        """Play `futures` futures of `rounds` rounds from the current state of `purge`
+        ## params
+            - `seed`: seed of the forecast's random stream, the game's streams are not used
+        """
+        rng = np.random.default_rng(seed)
+        S, B, C = self.size, futures, len(self.cities)
+        starts, sizes, adjacent, gateOf = self.starts, self.sizes, self.adjacent, self.gateOf
+        d0, e0, pawns, roadEdge, nurses = self.state(purge)
+        disease = np.repeat(d0[None, :], B, axis=0)
+        expiry = np.repeat(e0[None, :], B, axis=0)
+        now = purge.timers.round
+        rowsB = np.arange(B)[:, None]
+
+        overrunProb, infected = np.zeros((rounds + 1, C)), np.zeros((rounds + 1, C))
+        lossProb, clearedProb = np.zeros(rounds + 1), np.zeros(rounds + 1)
+        ever, lost, cleared = np.zeros((B, C), dtype=bool), np.zeros(B, dtype=bool), np.zeros(B, dtype=bool)
+
+        def record(r: int) -> None:
+            nonlocal lost, cleared
+            counts = np.add.reduceat(disease, starts, axis=1) if S else np.zeros((B, C), dtype=np.int64)
+            share = counts / sizes
+            over = np.round(share, 2) > City.OVERRUN_RATIO
+            ever[:] |= over
+            lost |= over.all(axis=1)
+            cleared |= counts.sum(axis=1) == 0
+            overrunProb[r], infected[r] = ever.mean(axis=0), share.mean(axis=0)
+            lossProb[r], clearedProb[r] = lost.mean(), cleared.mean()
+
+        record(0)
+        for r in range(1, rounds + 1):
+            covered = pawns.copy()
+            for _, k, counter in nurses:
+                if counter > 0 and k >= 0: covered[k] = True
+
+            # ◼︎ frontier: an infected square next to a free city square, or a gate
+            free = np.zeros((B, S + 1), dtype=bool)
+            free[:, :S] = ~disease & ~covered
+            nearFree = free[:, adjacent[:, 0]] | free[:, adjacent[:, 1]] | free[:, adjacent[:, 2]] | free[:, adjacent[:, 3]]
+            edge = disease & ~covered & (nearFree | roadEdge)
+
+            # ◼︎ one random frontier disease per city
+            keys = np.where(edge, rng.random((B, S)), -1.0)
+            best = np.maximum.reduceat(keys, starts, axis=1)
+            seeds = edge & (keys == np.repeat(best, sizes, axis=1))
+
+            # ◼︎ growth: the free squares with an expired timer next to a seed, and one road from seeded gates
+            open_ = free[:, :S] & (expiry <= now)
+            picked = np.zeros((B, S + 1), dtype=bool)
+            picked[:, :S] = seeds
+            hit = open_ & (picked[:, adjacent[:, 0]] | picked[:, adjacent[:, 1]] |
+                           picked[:, adjacent[:, 2]] | picked[:, adjacent[:, 3]])
+            b, k = np.nonzero(seeds & (gateOf >= 0))
+            if b.size:
+                g = gateOf[k]
+                ends = self.roadEnds[g, (rng.random(b.size) * self.roadCount[g]).astype(np.int64)]
+                crossing = open_[b, ends]
+                hit[b[crossing], ends[crossing]] = True
+            disease |= hit
+            expiry[hit] = now + SPREAD_TIMER
+            now += 1
+
+            # ◼︎ nurses cure around them
+            for n, (around, k, counter) in enumerate(nurses):
+                if counter <= 0: continue
+                if around.size:
+                    cured = disease[:, around]
+                    disease[:, around] = False
+                    left = np.maximum(expiry[:, around] - now, 0)
+                    expiry[rowsB, around[None, :]] = np.where(cured, now + left + CURE_TIMER, expiry[:, around])
+                nurses[n] = (around, k, counter - 1)
+            record(r)
+
+        return SpreadForecast(self.cities, B, overrunProb, infected, lossProb, clearedProb)
+
+
+def forecast(purge: Purge, rounds: int=10, futures: int=256, seed: int=None) -> SpreadForecast:
+    """Forecast the spreading of `purge` with a model built on the spot, keep
+        a `SpreadModel` to forecast the same game every turn
+    """
+    return SpreadModel(purge).forecast(purge, rounds, futures, seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge spread forecast")
+    parser.add_argument("--size", type=int, nargs=2, metavar="", default=[20, 20], help="Map height and width")
+    parser.add_argument("--cities", type=int, metavar="", default=4, help="City count")
+    parser.add_argument("--city_size", type=int, metavar="", default=15, help="Each city's size")
+    parser.add_argument("-s", "--seed", type=int, metavar="", default=0, help="Seed of the game")
+    parser.add_argument("-k", "--rounds", type=int, metavar="", default=10, help="Rounds to forecast")
+    parser.add_argument("-f", "--futures", type=int, metavar="", default=256, help="Futures played at once")
+    parser.add_argument("--played", type=int, metavar="", default=0, help="Rounds played before forecasting")
+    args = parser.parse_args()
+
+    purge = Purge(*args.size, args.cities, args.city_size, seed=args.seed)
+    for _ in range(args.played):
+        if purge.roundEnd(): break
+    start = time.perf_counter()
+    fc = forecast(purge, args.rounds, args.futures, args.seed)
+    print(f"{args.futures} futures of {args.rounds} rounds in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{'city':<12}{'infected':>10}{'overrun':>10}{'expected':>10}")
+    for c, city in enumerate(fc.cities):
+        print(f"{str(city.root):<12}{city.getInfectPercentage():>10.2f}{fc.overrunProb[-1, c]:>10.3f}{fc.infected[-1, c]:>10.3f}")
+    print(f"lost within {args.rounds} rounds: {fc.lossProb[-1]:.3f}, cleared: {fc.clearedProb[-1]:.3f}")
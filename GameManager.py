@@ -5,9 +5,10 @@ from TermArtist import TermArtist
 from Purge import Purge
 from Utils import PathFinder, DIRECTIONS_ALL, DIRECTIONS_ADJ, inBounds
 from Characters import *
+from Search import MCTS
 
-def twoplayers():
-    purge = Purge(12, 12, 3, 15)
+def twoplayers(seed: int=None):
+    purge = Purge(12, 12, 3, 15, seed=seed)
     print("======> Initial Map <======")
     purge.showMap()
 
@@ -110,10 +111,13 @@ def twoplayers():
 
 
 samecitycnt = 0
-def ai_knight():
+def ai_knight(seed: int=None, mcts: MCTS=None):
+    """Play the doctor against the heuristic knight, or against a knight
+        searched by `mcts` when provided
+    """
     global samecitycnt
 
-    purge = Purge(10, 10, 2, 5)
+    purge = Purge(10, 10, 2, 5, seed=seed)
     print("======> Initial Map <======")
     purge.showMap()
 
@@ -169,66 +173,39 @@ def ai_knight():
             map, M, N = purge.map, purge.M, purge.N
             knight = purge.knight
 
-            if purge.peekCellBase(*purge.doctor.root) == purge.peekCellBase(*purge.doctor.root):
-                print(samecitycnt)
-                samecitycnt += 1
-                if samecitycnt == 10:
-                    knight.switchPositionWithDoctor()
-                    samecitycnt = 0
+            if mcts:
+                turn = mcts.playTurn(purge, knight)
+                print(f"Knight: {turn.move} {turn.action} ({mcts.lastIterations} rollouts)")
+            else:
+                if purge.peekCellBase(*purge.doctor.root) == purge.peekCellBase(*purge.doctor.root):
+                    print(samecitycnt)
+                    samecitycnt += 1
+                    if samecitycnt == 10:
+                        knight.switchPositionWithDoctor()
+                        samecitycnt = 0
 
-            nearbyDisease = []
-            for i in range(1, 3):
-                for di, dj in DIRECTIONS_ALL:
-                    newPos = (knight.root[0]+di*i, knight.root[1]+dj*i)
-                    if not inBounds(*newPos, M, N): continue
-                    if isinstance(purge.peekCell(*newPos), Disease):
-                        nearbyDisease.append(newPos)
+                # ◼︎ throws whose 3x3 area holds a disease
+                nearbyDisease = [pos for pos in knight.disinfectantPositions()
+                                 if any(isinstance(purge.peekCell(*p), Disease) for p in purge.stencils.area(*pos))]
             
-            if nearbyDisease:
-                targetPos = random.choice(nearbyDisease)
-                for DIFF in DIRECTIONS_ALL:
-                    neiPos = (targetPos[0]+DIFF[0], targetPos[1]+DIFF[1])
-                    if inBounds(*neiPos, M, N) and type(purge.peekCellBase(*neiPos)) == City:
-                        purge.map[neiPos[0]][neiPos[1]].noUpdateCnt = 4
-                if inBounds(*targetPos, M, N) and type(purge.peekCellBase(*targetPos)) == City:
-                    purge.map[targetPos[0]][targetPos[1]].noUpdateCnt = 4
+                if nearbyDisease:
+                    targetPos = purge.aiRng.choice(nearbyDisease)
+                    knight.throwDisinfectantAt(targetPos)
             
-            else:
-                while True:
-                    targetCity = random.choice(purge.cities)
-                    if targetCity.edgeDiseases:
-                        targetDisease = random.choice(targetCity.edgeDiseases)
-                        knight_to_disease = PathFinder.astar(map, knight.root, targetDisease.root, 
-                                                            [purge.doctor, *purge.diseaseSeeds, *purge.trees])
-                        if knight_to_disease: break
-                curCity = purge.peekCellBase(*knight.root)
-                print(knight_to_disease)
-                if knight_to_disease != -1:
-                    isInOtherCity = False
-                    for path in knight_to_disease:
-                        if purge.peekCellBase(*path):
-                            isInOtherCity = True
-                            break
+                elif (infected:= [city for city in purge.cities if city.edgeDiseases]):
+                    roads = purge.roadNetwork
+                    targetCity = purge.aiRng.choice(infected)
+                    targetDisease = purge.aiRng.choice(targetCity.edgeDiseases)
 
-                    target_gate_pos = None
-                    if isInOtherCity:
-                        print("In Another City")
-                        for start_gate_pos, roads in curCity.roadsTo.items():
-                            for target_gate_path in roads:
-                                end_gate_pos = target_gate_path[0]
-                                if purge.peekCellBase(*end_gate_pos) == targetCity:
-                                    print("End gate:", end_gate_pos)
-                                    target_gate_pos = start_gate_pos if not purge.peekCellBase(*knight.root).isGate(*knight.root) else end_gate_pos
-                                    break
-                    print("Target gate", target_gate_pos)
-                    if target_gate_pos:
-                        if purge.peekCellBase(*knight.root).isGate(*knight.root):
-                            knight.moveTo(target_gate_pos)
-                        else:
-                            knight_to_disease = PathFinder.astar(map, knight.root, target_gate_pos, 
-                                                                [*purge.trees])
-                            print(knight_to_disease)
-                            knight.moveTo(knight_to_disease[1])
+                    # ◼︎ walk inside the city, or take the road found in the route table
+                    if roads.cityAt.get(knight.root) is targetCity:
+                        nextPos = roads.stepInCity(knight.root, targetDisease.root)
+                    else:
+                        nextPos = roads.nextStop(knight.root, targetCity)
+                        print("Target gate", nextPos)
+                        if nextPos and roads.cityAt.get(nextPos) is roads.cityAt.get(knight.root):
+                            nextPos = roads.stepInCity(knight.root, nextPos)
+                    if nextPos: knight.moveTo(nextPos)
             purge.showMap()
 
             # ========================================
@@ -251,14 +228,48 @@ def ai_knight():
             print(e.with_traceback())
 
 
+def ai_players(seed: int=None, mcts: MCTS=None, size: Tuple[int, int, int, int]=(12, 12, 3, 15)):
+    """Watch both players play by Monte Carlo tree search
+    ## params
+        - `size`: height, width, city count and city size of the map
+    """
+    purge = Purge(*size, seed=seed)
+    mcts = mcts or MCTS()
+    print("======> Initial Map <======")
+    purge.showMap()
+
+    status = 0
+    try:
+        while status == 0:
+            for pawn, actualEnd in ((purge.doctor, False), (purge.knight, True)):
+                turn = mcts.playTurn(purge, pawn)
+                purge.showMap()
+                print(f"{pawn.__class__.__name__}: {turn.move} {turn.action} "
+                      f"({mcts.lastIterations / mcts.lastSeconds:.0f} rollouts/s)")
+                status = purge.roundEnd(actualEnd)
+                print("Game Status:", status)
+                if status: break
+    except KeyboardInterrupt:
+        sys.exit()
+    print("you win!" if status == 1 else "you lose!")
+
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Purge")
     parser.add_argument("-ai", "--ai_knight", type=bool, metavar="", default=False,
                         action=argparse.BooleanOptionalAction, help="Start with an AI knight")
+    parser.add_argument("-m", "--mcts", type=bool, metavar="", default=False,
+                        action=argparse.BooleanOptionalAction,
+                        help="Play the AI players by Monte Carlo tree search, both of them without --ai_knight")
+    parser.add_argument("-b", "--budget", type=float, metavar="", default=0.5, help="Seconds per AI decision")
+    parser.add_argument("-s", "--seed", type=int, metavar="", default=None, help="Seed for replaying the same game")
     args = parser.parse_args()
 
-    if not args.ai_knight:
-        twoplayers()
+    mcts = MCTS(args.budget) if args.mcts else None
+    if args.mcts and not args.ai_knight:
+        ai_players(args.seed, mcts)
+    elif not args.ai_knight:
+        twoplayers(args.seed)
     elif args.ai_knight:
-        ai_knight()
\ No newline at end of file
+        ai_knight(args.seed, mcts)
\ No newline at end of file
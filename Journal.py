@@ -0,0 +1,211 @@
+"""
+Append-only journal of a Purge game.
+
+The players' actions and the end of every round are written as fixed 8 byte
+records. A keyframe (a full `Snapshot`) is written when the journal is
+attached and then every `keyframeEvery` rounds. The random outcomes of
+`roundEnd` are not stored, they are replayed from the random streams saved
+in the keyframes, each round end record keeps the game status and the
+disease count so a replay that drifts is caught right away.
+
+    journal = Journal("game.journal").attach(purge)
+    ... play ...
+    journal.close()
+
+    reader = JournalReader("game.journal")
+    purge = reader.seek(900) # nearest keyframe then the few actions after it
+"""
+from __future__ import annotations
+import struct
+from typing import *
+from Purge import Purge
+from Utils import *
+from Characters import *
+import Snapshot
+
+MAGIC = b"PRGJ"
+"First bytes of every journal"
+VERSION = 1
+"Format version, bumped whenever the layout changes"
+
+OPS: Dict[str, int] = {
+    "moveTo": 1,
+    "cureCross": 2,
+    "placeNurseAt": 3,
+    "throwDisinfectantAt": 4,
+    "switchPositionWithDoctor": 5,
+    "roundEnd": 6,
+}
+"Opcode of each recorded method"
+OP_KEYFRAME = 7
+"Opcode of a keyframe, followed by the length and bytes of a snapshot"
+OP_NAMES = {op: name for name, op in OPS.items()}
+
+PAWN_NONE, PAWN_DOCTOR, PAWN_KNIGHT = 0, 1, 2
+"Who issued a record"
+
+_FILE_HEADER = struct.Struct("<4sHH")
+"magic, version, keyframe interval"
+_RECORD = struct.Struct("<BBhi")
+"""opcode, pawn, small argument, int argument
+- `moveTo`: road index (-1 if not given), destination square
+- `placeNurseAt`, `throwDisinfectantAt`: -, target square
+- `roundEnd`: `actualEnd * 4 + status + 1`, disease count after the round
+- keyframe: -, round of the clock"""
+_LENGTH = struct.Struct("<I")
+
+
+class JournalRecord(NamedTuple):
+    """A decoded journal record"""
+    op: int
+    pawn: int
+    small: int
+    value: int
+    offset: int
+    "Byte offset of the record in the journal"
+
+    @property
+    def name(self) -> str:
+        return OP_NAMES.get(self.op, "keyframe")
+
+
+class Journal():
+    """
+    Writer of a game journal, the game calls `record` from its action methods
+    and `roundEnd` once attached
+    """
+    def __init__(self, path: str, keyframeEvery: int=50) -> None:
+        """
+        ## params
+            - `keyframeEvery`: rounds between two keyframes
+        """
+        self.path = path
+        self.keyframeEvery = keyframeEvery
+        "Rounds between two keyframes"
+        self.purge: Purge = None
+        "The recorded game"
+        self._file = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(MAGIC, VERSION, keyframeEvery))
+
+    def attach(self, purge: Purge) -> Journal:
+        "Start recording `purge` from its current state, written as the first keyframe"
+        self.purge = purge
+        purge.journal = self
+        self.keyframe()
+        return self
+
+    def keyframe(self) -> None:
+        "Write a full snapshot of the game"
+        data = Snapshot.dumps(self.purge)
+        self._file.write(_RECORD.pack(OP_KEYFRAME, PAWN_NONE, 0, self.purge.timers.round))
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        self._file.flush()
+
+    def record(self, name: str, pawn: object, *args) -> None:
+        """Append a record, called by the recorded methods
+        ## params
+            - `pawn`: the pawn issuing the action, `None` for `roundEnd`
+            - `args`: the arguments that replay the call, see `_RECORD`
+        """
+        purge, small, value = self.purge, 0, 0
+        if name == "moveTo":
+            pos, roadIdx = args[0], args[1] if len(args) > 1 else None
+            small, value = -1 if roadIdx is None else roadIdx, pos[0] * purge.N + pos[1]
+        elif name in ("placeNurseAt", "throwDisinfectantAt"):
+            value = args[0][0] * purge.N + args[0][1]
+        elif name == "roundEnd":
+            actualEnd, status = args
+            small, value = int(actualEnd) * 4 + status + 1, len(purge.diseaseSeeds)
+        who = PAWN_DOCTOR if isType(pawn, Doctor) else PAWN_KNIGHT if isType(pawn, Knight) else PAWN_NONE
+        self._file.write(_RECORD.pack(OPS[name], who, small, value))
+        if name == "roundEnd" and args[0] and purge.timers.round % self.keyframeEvery == 0:
+            self.keyframe()
+
+    def close(self) -> None:
+        "Stop recording and close the file"
+        if self.purge is not None and self.purge.journal is self: self.purge.journal = None
+        self._file.close()
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JournalReader():
+    """
+    Reader of a game journal. Opening it only indexes the keyframes, a game
+    at any round is rebuilt by `seek`.
+
+    `aiRng` is only restored at keyframes, the automated players' draws are
+    not recorded.
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f: self.data = f.read()
+        magic, version, self.keyframeEvery = _FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC: raise ValueError("Not a Purge journal")
+        if version != VERSION: raise ValueError(f"Unsupported journal version {version}, expected {VERSION}")
+        self.keyframes: List[Tuple[int, int]] = []
+        "(round, byte offset) of every keyframe"
+        self.rounds = 0
+        "Round of the last recorded round end"
+
+        for rec in self.records():
+            if rec.op == OP_KEYFRAME: self.keyframes.append((rec.value, rec.offset))
+            elif rec.op == OPS["roundEnd"] and rec.small >= 4: self.rounds += 1
+        if not self.keyframes: raise ValueError("The journal has no keyframe")
+        self.rounds += self.keyframes[0][0]
+
+    def records(self, offset: int=None) -> Iterator[JournalRecord]:
+        "Records from `offset` (the first one by default) to the end, skipping keyframe payloads"
+        data, k = self.data, _FILE_HEADER.size if offset is None else offset
+        while k + _RECORD.size <= len(data):
+            op, pawn, small, value = _RECORD.unpack_from(data, k)
+            yield JournalRecord(op, pawn, small, value, k)
+            k += _RECORD.size
+            if op == OP_KEYFRAME: k += _LENGTH.size + _LENGTH.unpack_from(data, k)[0]
+
+    def loadKeyframe(self, offset: int) -> Purge:
+        start = offset + _RECORD.size + _LENGTH.size
+        return Snapshot.loads(memoryview(self.data)[start:start + _LENGTH.unpack_from(self.data, offset + _RECORD.size)[0]])
+
+    def seek(self, round: int) -> Purge:
+        """The game right after the end of `round` (or at the first keyframe),
+            from the nearest keyframe before it and the records after that keyframe
+        """
+        if not self.keyframes[0][0] <= round <= self.rounds:
+            raise ValueError(f"Round {round} is not in the journal ({self.keyframes[0][0]} to {self.rounds})")
+        kRound, kOffset = max((kf for kf in self.keyframes if kf[0] <= round), key=lambda kf: kf[0])
+        purge = self.loadKeyframe(kOffset)
+        if purge.timers.round == round: return purge
+        for rec in self.records(kOffset):
+            if rec.op == OP_KEYFRAME: continue
+            self.apply(purge, rec)
+            if rec.op == OPS["roundEnd"] and purge.timers.round == round: break
+        return purge
+
+    @staticmethod
+    def apply(purge: Purge, rec: JournalRecord) -> None:
+        "Replay one record on `purge`, raise `RuntimeError` if a round ends differently than recorded"
+        N = purge.N
+        pawn = purge.doctor if rec.pawn == PAWN_DOCTOR else purge.knight
+        pos = (rec.value // N, rec.value % N)
+        if rec.op == OPS["moveTo"]:
+            pawn.moveTo(pos, None if rec.small < 0 else rec.small)
+        elif rec.op == OPS["cureCross"]:
+            purge.doctor.cureCross()
+        elif rec.op == OPS["placeNurseAt"]:
+            purge.doctor.placeNurseAt(pos)
+        elif rec.op == OPS["throwDisinfectantAt"]:
+            purge.knight.throwDisinfectantAt(pos)
+        elif rec.op == OPS["switchPositionWithDoctor"]:
+            purge.knight.switchPositionWithDoctor()
+        elif rec.op == OPS["roundEnd"]:
+            actualEnd, status = rec.small >= 4, rec.small % 4 - 1
+            if (purge.roundEnd(actualEnd), len(purge.diseaseSeeds)) != (status, rec.value):
+                raise RuntimeError(f"Replay drifted at round {purge.timers.round}: expected status {status} "
+                                   f"with {rec.value} diseases, got {len(purge.diseaseSeeds)}")
+        else:
+            raise ValueError(f"Unknown journal record {rec.op} at byte {rec.offset}")
@@ -0,0 +1,165 @@
+"""
+Load test of a Purge game server (see `Server`).
+
+Opens `concurrency` connections, each playing games one after the other: a
+game is created, played for `rounds` rounds with random legal moves and
+actions taken from the server's `options`, then closed. Reports the sessions
+completed per second and the latency percentiles of every op:
+
+    python LoadTest.py --spawn -c 50 -n 2000
+    python LoadTest.py --port 7878 -c 200 -n 10000 --rounds 5 -o load.json
+"""
+from __future__ import annotations
+import os, sys, argparse, asyncio, json, time, random, subprocess, tempfile
+from typing import *
+from Server import MAX_LINE
+
+
+class Client():
+    """One connection to the server, sending a request at a time"""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 latencies: Dict[str, List[float]]) -> None:
+        self.reader, self.writer = reader, writer
+        self.latencies = latencies
+        "Seconds of every request by op, shared by the clients of a run"
+        self._id = 0
+
+    @classmethod
+    async def connect(cls, host: str, port: int, unix: str, latencies: Dict[str, List[float]]) -> Client:
+        if unix: streams = await asyncio.open_unix_connection(unix, limit=MAX_LINE * 16)
+        else: streams = await asyncio.open_connection(host, port, limit=MAX_LINE * 16)
+        return cls(*streams, latencies)
+
+    async def request(self, op: str, **params) -> Dict[str, Any]:
+        "Send a request and wait for its response, raising `RuntimeError` on an error response"
+        self._id += 1
+        start = time.perf_counter()
+        self.writer.write(json.dumps({"id": self._id, "op": op, **params}).encode() + b"\n")
+        await self.writer.drain()
+        res = json.loads(await self.reader.readline())
+        self.latencies.setdefault(op, []).append(time.perf_counter() - start)
+        if not res["ok"]: raise RuntimeError(f"{op}: {res['error']}")
+        return res
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def playGame(client: Client, rng: random.Random, rounds: int, size: Tuple[int, int, int, int]) -> int:
+    """Create a game, play it with random legal turns and close it
+    ### return
+        - the game's status
+    """
+    h, w, cities, citySize = size
+    res = await client.request("new", size=[h, w], cities=cities, city_size=citySize,
+                               seed=rng.getrandbits(32), options=True)
+    sid, state = res["session"], res["state"]
+    while state["status"] == 0 and state["round"] < rounds:
+        if state["phase"] == "move":
+            i, j, road = rng.choice(state["moves"] + [None]) or (None, None, None)
+            if i is None: state = (await client.request("sacrifice", session=sid, options=True))["state"]
+            else: state = (await client.request("move", session=sid, pos=[i, j], road=road, options=True))["state"]
+        else:
+            action = rng.choice(state["actions"])
+            state = (await client.request("action", session=sid, options=True, **action))["state"]
+    await client.request("close", session=sid)
+    return state["status"]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    "p50, p90, p99 and max of `values`, in milliseconds"
+    values = sorted(values)
+    at = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return {"count": len(values), "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": values[-1] * 1000}
+
+
+async def run(host: str="127.0.0.1", port: int=7878, unix: str=None, concurrency: int=20, sessions: int=500,
+              rounds: int=10, size: Tuple[int, int, int, int]=(12, 12, 3, 15), seed: int=0) -> Dict[str, Any]:
+    """Play `sessions` games over `concurrency` connections
+    ### return
+        - sessions per second, outcomes and the latency percentiles of every op
+    """
+    latencies: Dict[str, List[float]] = {}
+    outcomes = {-1: 0, 0: 0, 1: 0}
+    left = sessions
+
+    async def worker(k: int) -> None:
+        nonlocal left
+        client = await Client.connect(host, port, unix, latencies)
+        rng = random.Random(seed * 100_003 + k)
+        try:
+            while left > 0:
+                left -= 1
+                outcomes[await playGame(client, rng, rounds, size)] += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "sessionsPerSecond": sessions / elapsed,
+        "requestsPerSecond": sum(map(len, latencies.values())) / elapsed,
+        "outcomes": {"lose": outcomes[-1], "unfinished": outcomes[0], "win": outcomes[1]},
+        "latencyMs": {op: percentiles(values) for op, values in latencies.items()},
+    }
+
+
+async def waitForServer(host: str, port: int, unix: str, timeout: float=10.0) -> None:
+    "Wait until the server accepts connections"
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if unix: _, writer = await asyncio.open_unix_connection(unix)
+            else: _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline: raise
+            await asyncio.sleep(0.05)
+
+
+def report(res: Dict[str, Any]) -> None:
+    print(f"{res['sessions']} sessions over {res['concurrency']} connections in {res['seconds']:.2f} s: "
+          f"{res['sessionsPerSecond']:.1f} sessions/s, {res['requestsPerSecond']:.0f} requests/s")
+    print(f"{'op':<12}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op, p in res["latencyMs"].items():
+        print(f"{op:<12}{p['count']:>8}{p['p50']:>10.3f}{p['p90']:>10.3f}{p['p99']:>10.3f}{p['max']:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge server load test")
+    parser.add_argument("--host", type=str, metavar="", default="127.0.0.1", help="Server address")
+    parser.add_argument("-p", "--port", type=int, metavar="", default=7878, help="Server TCP port")
+    parser.add_argument("-u", "--unix", type=str, metavar="", default=None, help="Server Unix socket")
+    parser.add_argument("--spawn", type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="Start a local server on a temporary Unix socket for the run")
+    parser.add_argument("-c", "--concurrency", type=int, metavar="", default=20, help="Connections playing at once")
+    parser.add_argument("-n", "--sessions", type=int, metavar="", default=500, help="Games to play")
+    parser.add_argument("-r", "--rounds", type=int, metavar="", default=10, help="Rounds played per game")
+    parser.add_argument("--size", type=int, nargs=4, metavar="", default=[12, 12, 3, 15],
+                        help="Map height, width, city count and city size")
+    parser.add_argument("-s", "--seed", type=int, metavar="", default=0, help="Seed of the games and the moves")
+    parser.add_argument("-o", "--out", type=str, metavar="", default=None, help="Save the results to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        args.unix = os.path.join(tempfile.mkdtemp(), "purge.sock")
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Server.py"),
+                                   "--unix", args.unix], stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(waitForServer(args.host, args.port, args.unix))
+        res = asyncio.run(run(args.host, args.port, args.unix, args.concurrency, args.sessions,
+                              args.rounds, tuple(args.size), args.seed))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    report(res)
+    if args.out:
+        with open(args.out, "w") as f: json.dump(res, f, indent=2)
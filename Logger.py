@@ -1,3 +1,5 @@
+import sys, time, atexit
+from collections import deque
 from typing import *
 from enum import Enum
 from TermArtist import TermArtist
@@ -5,11 +7,14 @@ from functools import total_ordering
 
 @total_ordering
 class DebugLevel(Enum):
-    INFO = 0
-    WARN = 1
-    DEBUG = 2
-    ERROR = 3
-    ALL = 4
+    """Severity of a log record, a logger shows the records at or above its level"""
+    ALL = 0
+    DEBUG = 10
+    INFO = 20
+    WARN = 30
+    ERROR = 40
+    NONE = 50
+    "Above every record, turns a logger off"
 
     def __lt__(self, other):
         if self.__class__ is other.__class__:
@@ -17,26 +22,157 @@ class DebugLevel(Enum):
         return NotImplemented
 
 
+class LogRecord(NamedTuple):
+    """A log call, the message is only formatted when a sink reads it"""
+    level: DebugLevel
+    msg: Any
+    "Message, a %-format string when `args` is not empty"
+    args: Tuple
+    created: float
+    "`time.time()` of the call"
+    start: str = ""
+    end: str = "\n"
+
+    @property
+    def message(self) -> str:
+        return self.msg % self.args if self.args else str(self.msg)
+
+
+# =============================
+# Sinks
+# =============================
+class StdoutSink():
+    """Prints each record right away, colored by level"""
+    COLORS = {
+        DebugLevel.DEBUG: TermArtist.DEBUG,
+        DebugLevel.INFO: TermArtist.RESET,
+        DebugLevel.WARN: TermArtist.YELLOW,
+        DebugLevel.ERROR: TermArtist.RED,
+    }
+
+    def __call__(self, record: LogRecord) -> None:
+        print(f"{self.COLORS[record.level]}{record.start}[{record.level.name}]{TermArtist.RESET}",
+              record.message, end=record.end)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+
+class RingBufferSink():
+    """Keeps the last `capacity` records in memory without formatting them"""
+    def __init__(self, capacity: int=10000) -> None:
+        self.records: Deque[LogRecord] = deque(maxlen=capacity)
+        "The kept records, oldest first"
+
+    def __call__(self, record: LogRecord) -> None:
+        self.records.append(record)
+
+    def flush(self) -> None:
+        pass
+
+    def lines(self) -> List[str]:
+        "The kept records formatted as `[LEVEL] message`"
+        return [f"[{r.level.name}] {r.message}" for r in self.records]
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+class FileSink():
+    """
+    Appends records to a file, written `batchSize` records at a time
+
+    WARN and ERROR records are written right away together with the pending ones,
+    and whatever is still pending is written at interpreter exit, so `close`
+    is only needed to release the file early.
+    """
+    def __init__(self, path: str, batchSize: int=512) -> None:
+        self.path = path
+        self.batchSize = batchSize
+        self.pending: List[LogRecord] = []
+        "Records not written yet"
+        self._file = open(path, "a", encoding="utf-8")
+        atexit.register(self.flush)
+
+    def __call__(self, record: LogRecord) -> None:
+        self.pending.append(record)
+        if len(self.pending) >= self.batchSize or record.level >= DebugLevel.WARN: self.flush()
+
+    def flush(self) -> None:
+        if not self.pending: return
+        self._file.write("".join(f"{r.created:.6f} [{r.level.name}] {r.message}\n" for r in self.pending))
+        self._file.flush()
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        atexit.unregister(self.flush)
+
+
+# =============================
+# Logger
+# =============================
 class Logger():
     """
     Logger containing multiple log levels
+
+    Messages take %-style arguments which are only formatted when a sink reads
+    the record, a call below the logger's level returns after one comparison.
+    Use `isEnabledFor` to skip building costly arguments altogether:
+
+        LOGGER.debug("path %s -> %s: %s", start, end, path)
+        if LOGGER.isEnabledFor(DebugLevel.DEBUG): LOGGER.debug("%s", expensive())
     """
 
-    def __init__(self, log_level: DebugLevel) -> None:
+    def __init__(self, log_level: DebugLevel, sink: Callable[[LogRecord], None]=None) -> None:
+        """
+        ## params
+            - `sink`: receives the shown records, a `StdoutSink` if not provided
+        """
+        self.sink = sink if sink is not None else StdoutSink()
+        "Receives the records at or above `debug_level`"
         self.debug_level = log_level
 
-    def info(self, value: Any, start="", end="\n"):
-        if self.debug_level >= DebugLevel.INFO:
-            print(f"{TermArtist.RESET}{start}[INFO]{TermArtist.RESET}", value, end=end)
+    @property
+    def debug_level(self) -> DebugLevel:
+        return self._level
+
+    @debug_level.setter
+    def debug_level(self, level: DebugLevel) -> None:
+        self._level = level
+        self._threshold = level.value
+
+    def isEnabledFor(self, level: DebugLevel) -> bool:
+        "If a record of `level` would be shown"
+        return level.value >= self._threshold
+
+    def log(self, level: DebugLevel, msg: Any, *args, start="", end="\n") -> None:
+        """Log at any record level
+        ### raise
+            - `ValueError`: `level` is `ALL` or `NONE`, which are only thresholds for `debug_level`
+        """
+        if level is DebugLevel.ALL or level is DebugLevel.NONE:
+            raise ValueError(f"{level.name} is a logger threshold, not a record level")
+        if level.value >= self._threshold:
+            self.sink(LogRecord(level, msg, args, time.time(), start, end))
+
+    def debug(self, msg: Any, *args, start="", end="\n"):
+        if self._threshold <= DebugLevel.DEBUG.value:
+            self.sink(LogRecord(DebugLevel.DEBUG, msg, args, time.time(), start, end))
+
+    def info(self, msg: Any, *args, start="", end="\n"):
+        if self._threshold <= DebugLevel.INFO.value:
+            self.sink(LogRecord(DebugLevel.INFO, msg, args, time.time(), start, end))
 
-    def warn(self, value: Any, start="", end="\n"):
-        if self.debug_level >= DebugLevel.WARN:
-            print(f"{TermArtist.YELLOW}{start}[WARN]{TermArtist.RESET}", value, end=end)
+    def warn(self, msg: Any, *args, start="", end="\n"):
+        if self._threshold <= DebugLevel.WARN.value:
+            self.sink(LogRecord(DebugLevel.WARN, msg, args, time.time(), start, end))
 
-    def debug(self, value: Any, start="", end="\n"):
-        if self.debug_level >= DebugLevel.DEBUG:
-            print(f"{TermArtist.DEBUG}{start}[DEBUG]{TermArtist.RESET}", value, end=end)
+    def error(self, msg: Any, *args, start="", end="\n"):
+        if self._threshold <= DebugLevel.ERROR.value:
+            self.sink(LogRecord(DebugLevel.ERROR, msg, args, time.time(), start, end))
 
-    def error(self, value: Any, start="", end="\n"):
-        if self.debug_level >= DebugLevel.ERROR:
-            print(f"{TermArtist.RED}{start}[ERROR]{TermArtist.RESET}", value, end=end)
+    def flush(self) -> None:
+        "Write out what the sink is holding back"
+        self.sink.flush()
@@ -15,53 +15,89 @@ from TermArtist import TermArtist
 from Utils import *
 
 from Characters import *
+from ArrayBoard import ArrayBoard
+from RoadNetwork import RoadNetwork
+from Renderer import Renderer, ALIGN, ecbCh, ecbCh_gate, disCh, treeCh, knightCh, docCh, roadCh, nurseCh
 
-ALIGN = 3
-"Text Alignment"
-
-ecbCh = f"{'□':<{ALIGN}}"
-"Empty city block character"
-ecbCh_gate = f"{TermArtist.RED}{'□':<{ALIGN}}{TermArtist.RESET}"
-"Empty city gate block character"
-disCh = f"{TermArtist.GREEN}{'✶':<{ALIGN}}{TermArtist.RESET}"
-"Disease block character"
-treeCh = f"🌲"
-"Tree block character"
-knightCh = f"{TermArtist.BLUE}{'🐴':<{ALIGN-1}}{TermArtist.RESET}"
-"Knight symbol character"
-docCh = f"{'✚':<{ALIGN}}"
-"Doctor symbol character"
-roadCh = f"{'_':<{ALIGN}}"
-"Path symbol character"
-nurseCh = f"{TermArtist.BLUE}{'✚':<{ALIGN}}{TermArtist.RESET}"
+if TYPE_CHECKING:
+    from Journal import Journal
+
+CELL_BYTES = 152
+"""Memory of one map square made of a `Cell` holding a single base element
+(row list slot + `Cell` + its stack list, measured with tracemalloc on CPython 3.11)"""
 
 
 # =============================
 # Fundamental Classes
 # =============================
+class CellTimers():
+    """Clock of the `noUpdateCnt` timers of a game
+
+    A timer is stored as the round it expires at, so ending a round only moves
+    the clock instead of decrementing every cell, and a timer has run out once
+    the clock reaches its expiry round.
+    """
+    __slots__ = ("round",)
+
+    def __init__(self) -> None:
+        self.round = 0
+        "Number of rounds ended so far"
+
+    def remaining(self, expiry: int) -> int:
+        "Rounds left before a timer expiring at `expiry` runs out"
+        return expiry - self.round if expiry > self.round else 0
+
+    def schedule(self, count: int) -> int:
+        """Start a timer of `count` rounds
+        ### return
+            - `int`: the expiry round of the timer
+        """
+        return self.round + count
+
+    def advance(self) -> None:
+        "End the round"
+        self.round += 1
+
+
 class Cell():
     """A cell is basically a stack, but only store 
         a single instance of the same type of objects
+
+    A `Cell` map costs about `CELL_BYTES` bytes per square, an `ArrayBoard`
+    about `ArrayBoard.BYTES_PER_SQUARE`, pawns on the squares not included
     """
-    def __init__(self) -> None:
+    __slots__ = ("stk", "expiry", "timers")
+
+    def __init__(self, timers: CellTimers=None) -> None:
         self.stk: List[object] = []
-        self.LOGGERR = Logger(DebugLevel.INFO)
-        self.noUpdateCnt = 0
+        self.timers = timers if timers is not None else CellTimers()
+        "The clock of the game this cell belongs to"
+        self.expiry = 0
+        "Round at which `noUpdateCnt` runs out"
+
+    @property
+    def noUpdateCnt(self) -> int:
         """For checking if system can put stuff other than characters in the cell"""
+        return self.timers.remaining(self.expiry)
+
+    @noUpdateCnt.setter
+    def noUpdateCnt(self, val: int) -> None:
+        self.expiry = self.timers.schedule(val)
 
     @property
     def canBeUpdate(self) -> bool:
-        return self.noUpdateCnt <= 0
+        return self.expiry <= self.timers.round
 
     def __len__(self):
         return len(self.stk)
 
-    def putOnTop(self, val: object):
-        "Add to cell"
+    def putOnTop(self, val: object) -> bool:
+        "Add to cell, `False` if it already holds the same type of object"
         if self.getElemFromStack(type(val)):
-            self.LOGGERR.warn(f"Cell already contains a: {val.__class__}", )
-            return
+            LOGGER.debug("Cell already contains a: %s", val.__class__)
+            return False
         self.stk.append(val)
+        return True
 
     def pop(self):
         "Pop the top most element unless there is only one left"
@@ -93,98 +129,315 @@ class Cell():
         "Hard reset stack to empty"
         self.stk: List[str] = []
 
-    def turnEnd(self):
-        if self.noUpdateCnt > 0: self.noUpdateCnt -= 1
-
 
 # =============================
 # Main Game Class
 # =============================
+class SharedRow():
+    """A row of a `Cell` map shared between a game and its `Purge.clone` copies,
+        or built by `Snapshot.load` from a template cell per base. The cells of
+        `source` are not written anymore: the row is copied for its game on the
+        first access and replaces this placeholder in `Purge.map`
+    """
+    __slots__ = ("purgeRef", "i", "source", "memo", "row")
+
+    def __init__(self, purge: Purge, i: int, source: List[Cell], memo: Dict[int, object]=None) -> None:
+        self.purgeRef, self.i = purge, i
+        self.source = source
+        "Cells of the game the row was taken from"
+        self.memo = memo
+        "Object of this game for each object of `source`, keyed by `id`, `None` if they are the same"
+        self.row: List[Cell] = None
+        "The copy of the row, once made"
+
+    def own(self) -> List[Cell]:
+        "The row of this game, copied from `source` on the first call"
+        if (row:= self.row) is None:
+            timers, get = self.purgeRef.timers, self.memo.get if self.memo else None
+            row = self.row = []
+            for cell in self.source:
+                new, stk = Cell.__new__(Cell), cell.stk
+                # ◼︎ a lone tree or road is shared by every game, the stack is copied as is
+                new.stk = stk.copy() if get is None or len(stk) == 1 and type(stk[0]) is not City else [get(id(el), el) for el in stk]
+                new.expiry, new.timers = cell.expiry, timers
+                row.append(new)
+            self.purgeRef.map[self.i] = row
+        return row
+
+    def __getitem__(self, j: int) -> Cell:
+        return self.own()[j]
+
+    def __iter__(self) -> Iterator[Cell]:
+        return iter(self.own())
+
+    def __len__(self):
+        return len(self.source)
+
+
 class Purge():
     """
     Contains core functions of the game Purge.
     """
-    def __init__(self, h: int=10, w: int=10, city_count: int=3, city_size: int=5) -> None:
+    LAYOUT_TRIES = 20
+    "Times the city layout is started over when a city finds no room, before giving up"
+    EXTRA_ROADS = 0.25
+    "Roads added on top of the spanning tree that connects the cities, per city"
+
+    def __init__(self, h: int=10, w: int=10, city_count: int=3, city_size: int=5,
+                 array_board: bool=False, seed: int=None, stats: bool=False, generate: bool=True) -> None:
         """ Create a Purge game
             Automatically generate a map and variables for the game
+        ## params
+            - `array_board`: store the map as compact numpy layers (see `ArrayBoard`)
+              and find the frontiers and overrun cities with whole-array operations,
+              the games played are the same as on a `Cell` map
+            - `seed`: seed of the game's random streams, the same seed plays 
+              the same game in any process and with or without `array_board`.
+              Random if not provided
+            - `stats`: time the phases of generation and rounds and count 
+              events in `self.stats`
+            - `generate`: generate the map, `False` leaves the map and the cities
+              for `Snapshot.load` to fill in
         """
         self.M, self.N = h, w
         "The dimensions of the map, M: height, N: width"
+        self.stencils = Stencils.of(h, w)
+        "Neighbourhood tables of the board, shared with every game of this size"
         self.city_count = city_count
         "City count"
         self.city_size = city_size
         "Each city's size"
-        self.map = [[Cell() for _ in range(w)] for _ in range(h)]
-        "The current map of the Purge game"
+        self._checkParameters()
+        self.seed = seed
+        "Seed of the game's random streams"
+        self.rng = random.Random(seed)
+        "Root random stream of the game, only used for splitting off the child streams"
+        self.genRng = random.Random(self.rng.getrandbits(64))
+        "Random stream of the map generation"
+        self.spreadRng = random.Random(self.rng.getrandbits(64))
+        "Random stream of the disease spreading"
+        self.aiRng = random.Random(self.rng.getrandbits(64))
+        "Random stream for automated players"
+        self.stats = Stats(stats)
+        "Phase timers and event counters, only recording when enabled"
+        self.timers = CellTimers()
+        "Clock of the cells' `noUpdateCnt` timers"
+        self.board: ArrayBoard = ArrayBoard(self, h, w) if array_board else None
+        "Array-backed board, `None` when the map is made of `Cell` objects"
+        self.map = self.board.grid if self.board else [[Cell(self.timers) for _ in range(w)] for _ in range(h)] if generate else [None] * h
+        "The current map of the Purge game, rows left for `Snapshot.load` to fill in when not generated"
         self.doctor: Doctor = None
         "Master character object: doctor"
         self.knight: Knight = None
         "Master character object: knight"
-        self.diseaseSeeds: List[Disease] = []
-        "All the disease cells in the map"
+        self.diseaseSeeds: DiseaseRegistry = DiseaseRegistry()
+        "All the disease cells in the map, kept up to date by the map functions"
         self.nurses: List[Nurse] = []
         "A list of all nurses"
-        self.trees: List[Tree] = []
-        "A list of all trees"
-        self.cities = self._generateMap()
+        self.trees: List[Tree] = [TREE]
+        "A list of all trees, every tree square shares the `TREE` flyweight"
+        self.overRunCities: Set[City] = set()
+        "Cities whose infected percentage is above `City.OVERRUN_RATIO`"
+        self.cities: List[City] = self._generateMap() if generate else []
         "city objects of the current Purge game"
+        self.journal: Journal = None
+        "Records the actions and rounds of the game when set, see `Journal.attach`"
+        self.debugFrontier = False
+        "Check the cities' incremental frontiers against a full rescan on every `roundEnd`"
+        self._roadNetwork: RoadNetwork = None
+        "Gate-to-gate road graph and route table of the map, see `roadNetwork`"
+        if generate:
+            with self.stats.phase("gen.roadNetwork"): self._roadNetwork = RoadNetwork(self.cities)
+        self.renderer = Renderer(self)
+        "Draws the map for `showMap`"
         
 
     def _resetToEmptyMap(self):
         "reset back to a completely empty map"
+        self.overRunCities.clear()
+        self.diseaseSeeds.clear()
+        if self.board:
+            self.board.reset()
+            return
         for i in range(self.M):
             for j in range(self.N):
                 self.map[i][j].reset()
 
 
+    def _checkParameters(self) -> None:
+        """Reject map parameters no map can satisfy: cities are laid out inside
+            a 1 square padding and never touch each other
+        """
+        h, w, count, size = self.M, self.N, self.city_count, self.city_size
+        if h < 3 or w < 3:
+            raise ValueError(f"The map must be at least 3x3, got {h}x{w}")
+        if count < 2:
+            raise ValueError(f"At least 2 cities are needed, one for the master characters and one for the disease, got {count}")
+        if size < 2:
+            raise ValueError(f"A city needs at least 2 squares for the doctor and the knight, got {size}")
+        if count * size + count - 1 > (h-2) * (w-2):
+            raise ValueError(f"{count} cities of {size} squares, 1 square apart, cannot fit in a {h}x{w} map")
+
+    def _layoutCities(self) -> Union[List[List[Tuple[int, int]]], None]:
+        """Pick the squares of every city without touching the map
+
+        Cities are laid out one after another. A seed square is only taken if 
+        the squares reachable from it without facing another city can hold a 
+        whole city, then the city grows by picking from its frontier: the free 
+        squares next to it that do not face another city. A seed without room 
+        is repaired by picking another one, the cities already laid out stay.
+        ### return
+            - the squares of each city, the seed first
+            - `None` if there is no room left for a city
+        """
+        M, N, rng, size, stats = self.M, self.N, self.genRng, self.city_size, self.stats
+        owner = [-1] * (M*N)
+        "City index owning each square (flat index), -1 if none"
+        steps = (-N, N, -1, 1)
+        dead: Set[int] = set()
+        "Squares known to be in a pocket too small for a city"
+
+        def free(k: int, c: int) -> bool:
+            i, j = divmod(k, N)
+            if owner[k] != -1 or not (0 < i < M-1 and 0 < j < N-1): return False
+            return all(owner[k + d] in (-1, c) for d in steps)
+
+        def hasRoom(seed: int, c: int) -> bool:
+            seen, stk = {seed}, [seed]
+            while stk and len(seen) < size:
+                k = stk.pop()
+                for d in steps:
+                    if (nk:= k + d) not in seen and free(nk, c):
+                        seen.add(nk)
+                        stk.append(nk)
+            if len(seen) >= size: return True
+            dead.update(seen)
+            if stats.enabled: stats.count("seedRepairs")
+            return False
+
+        def pickSeed(c: int) -> Union[int, None]:
+            for _ in range(32):
+                k = rng.randrange(1, M-1) * N + rng.randrange(1, N-1)
+                if k not in dead and free(k, c) and hasRoom(k, c): return k
+            # ◼︎ crowded map: go through every free square once
+            candidates = [k for k in range(N, (M-1) * N) if k not in dead and free(k, c)]
+            rng.shuffle(candidates)
+            return next((k for k in candidates if k not in dead and hasRoom(k, c)), None)
+
+        layouts = []
+        for c in range(self.city_count):
+            if (seed:= pickSeed(c)) is None: return None
+            owner[seed] = c
+            cells, frontier = [seed], IndexedSet(seed + d for d in steps if free(seed + d, c))
+            while len(cells) < size:
+                k = rng.choice(frontier)
+                frontier.discard(k)
+                owner[k] = c
+                cells.append(k)
+                for d in steps:
+                    if free(k + d, c): frontier.add(k + d)
+            layouts.append([divmod(k, N) for k in cells])
+        return layouts
+
+    def _planRoads(self, cities: List[City]) -> List[Tuple[int, int, List[Tuple[int, int]]]]:
+        """Pick the roads between cities in one pass
+
+        A single breadth first search starts from the edges of every city at 
+        once and spreads over the squares outside of the cities, each square is 
+        claimed by the city whose front reaches it first. Where the fronts of 
+        two cities meet, the two search trees joined at the meeting squares make 
+        the shortest road between them through their claimed squares. The roads 
+        are a minimum spanning tree of the meeting graph, so every city can be 
+        reached, plus `EXTRA_ROADS` of the other meetings picked at random.
+        ### return
+            - (city index, other city index, path) of each road, the path starts 
+              on the first city and ends on the other one
+        """
+        M, N, rng = self.M, self.N, self.genRng
+        owner, parent, dist = [-1] * (M*N), [-1] * (M*N), [0] * (M*N)
+        for c, city in enumerate(cities):
+            for i, j in city.cells_pos: owner[i*N + j] = c
+
+        # ◼︎ shared fronts: all city edges are sources of the same search
+        queue = [i*N + j for city in cities for i, j in dict.fromkeys(city.edgePositions)]
+        rng.shuffle(queue)
+        meetings: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+        "(city a, city b) -> (road length, square claimed by a, square claimed by b), a < b"
+        for u in queue: # the queue grows while iterating
+            a, (i, j) = owner[u], divmod(u, N)
+            for v in (u-N if i > 0 else -1, u+N if i < M-1 else -1, u-1 if j > 0 else -1, u+1 if j < N-1 else -1):
+                if v < 0: continue
+                if (b:= owner[v]) == -1:
+                    owner[v], parent[v], dist[v] = a, u, dist[u] + 1
+                    queue.append(v)
+                elif b != a:
+                    key, ends = ((a, b), (u, v)) if a < b else ((b, a), (v, u))
+                    length = dist[u] + dist[v] + 1
+                    if key not in meetings or length < meetings[key][0]: meetings[key] = (length, *ends)
+
+        if self.stats.enabled: self.stats.count("roadSearchSquares", len(queue))
+
+        LOGGER.debug("Connecting cities...")
+        ranked = sorted(meetings, key=lambda key: (meetings[key][0], rng.random()))
+        tree, rest, connected = [], [], DisjointSet(len(cities))
+        for key in ranked:
+            (tree if connected.union(*key) else rest).append(key)
+        if connected.cnt != 1:
+            raise RuntimeError("Some cities cannot be reached by road")
+        extra = rng.sample(rest, min(len(rest), round(len(cities) * self.EXTRA_ROADS)))
+
+        def trace(k: int) -> List[Tuple[int, int]]:
+            res = []
+            while k != -1:
+                res.append(divmod(k, N))
+                k = parent[k]
+            return res
+
+        if self.stats.enabled: self.stats.count("roads", len(tree) + len(extra))
+        roads = []
+        for a, b in tree + extra:
+            _, u, v = meetings[(a, b)]
+            roads.append((a, b, trace(u)[::-1] + trace(v)))
+        return roads
+
     def _generateMap(self) -> List[City]:
         """ Generate a map according to the parameters from constructor """
-        LOGGER = Logger(DebugLevel.INFO)
         cls = self.__class__
-        map = self.map
+        map, rng = self.map, self.genRng
         M, N = self.M, self.N
 
-        roots = set() # for validating
-        cities: List[City] = []
+        stats = self.stats
 
-        while len(roots) != self.city_count:
-            LOGGER.debug("Initializing variables for generating new map")
-            roots, cities = set(), []
-            # CITYNAMES = ["Raccoon City", "Metropolis", "Silent Hill", "San Andreas", "Rhodes", "San Denis", "Chambana"]
-            # random.shuffle(CITYNAMES)
-            self._resetToEmptyMap()
+        LOGGER.debug("Generating new map...")
+        with stats.phase("gen.layout"):
+            for _ in range(self.LAYOUT_TRIES):
+                if (layouts:= self._layoutCities()) is not None: break
+                LOGGER.debug("No room left for a city, laying out the map again")
+                if stats.enabled: stats.count("layoutRestarts")
+            else:
+                raise RuntimeError(f"Could not fit {self.city_count} cities of {self.city_size} squares "
+                                   f"in a {M}x{N} map after {self.LAYOUT_TRIES} tries")
 
-            LOGGER.debug("Generating new map...")
-            for i in range(self.city_count):
-                while True:
-                    rx, ry = random.randrange(1, M-1), random.randrange(1, N-1) # padding
-                    if not self.peekCell(rx,ry): break
-
-                self.putOnMap((rx,ry), (city:= City(self, rx, ry)) )
-                cities.append(city)
-
-                LOGGER.debug("Putting in city cells...")
-                tryCnt, maxTryCnt = 0, M*N
-                while len(city.cells_pos) != self.city_size and tryCnt <= maxTryCnt:
-                    i, j = random.choice(list(city.cells_pos))
-                    di, dj = random.choice(DIRECTIONS_ADJ)
-                    if (inBounds((nI:=i+di), (nJ:=j+dj), M-1, N-1, 1, 1) and
-                        not isType(self.peekCell(nI, nJ), City)  
-                       ):
-                        city.addCellPos((nI, nJ))
-                        self.putOnMap((nI,nJ), city)
-                    tryCnt += 1
-            if tryCnt == maxTryCnt: continue # one of the city failed
-
-            LOGGER.debug("Validating randomly generated cities...")
-            roots = DisjointSet.Merger.dfsUnion(map, cities)
-
-        # LOGGER.debug("Finializing cities' initialization")
-        # for city in cities: 
-        #     city.edgePositions
+        LOGGER.debug("Putting in city cells...")
+        with stats.phase("gen.cities"):
+            self._resetToEmptyMap()
+            cities: List[City] = []
+            for cells in layouts:
+                cities.append(city:= City(self, *cells[0]))
+                for pos in cells:
+                    city.addCellPos(pos)
+                    self.putOnMap(pos, city)
+
+        LOGGER.debug("Validating generated cities...")
+        with stats.phase("gen.validate"):
+            if len(DisjointSet.Merger.dfsUnion(map, cities)) != self.city_count:
+                raise RuntimeError("Generated cities are touching each other")
+
+        LOGGER.debug("Finializing cities' initialization")
+        for city in cities: 
+            city.freezeGeometry()
 
         LOGGER.debug("Putting stuff in cities")
-        roadSet = set()
         for i, city in enumerate(cities):
             LOGGER.debug("Putting master characters and diseases")
             if i == 0:
@@ -195,62 +448,51 @@ class Purge():
                 self.putOnMap(pos2, self.knight)
             else:
                 pos = list(city.cells_pos)[0]
-                diseaseSeed = Disease(self, pos)
-                self.diseaseSeeds.append(diseaseSeed)
-                map[pos[0]][pos[1]].putOnTop(diseaseSeed)
-
-            LOGGER.debug("Building roads...")
-            while True:
-                LOGGER.debug("Finding destination...")
-                destCity: City = random.choice(cities)
-                if city != destCity: break
-            
-            if not (key:= min((city, destCity), (destCity, city))) in roadSet:
-                roadSet.add(key)
-            else:
-                continue
-
-            foundPath = -1
-            while foundPath == -1:  
-                LOGGER.debug("Finding path...")
-                start = random.choice(city.edgePositions)
-                end   = random.choice(destCity.edgePositions)
-                foundPath = PathFinder.astar(map, start, end, 
-                                                [*cities, self.doctor, self.knight, *self.diseaseSeeds])
-                LOGGER.debug((start, end, foundPath))
-                
-            city.roadsTo[start].append((end, foundPath))
-            destCity.roadsTo[end].append((start, foundPath))
-
-            road = Road(self)
-            for i, j in foundPath:
-                if (i, j) not in [start, end]: map[i][j].putOnTop(road)
-
+                self.putOnMap(pos, Disease(self, pos))
+
+        LOGGER.debug("Building roads...")
+        with stats.phase("gen.roads"):
+            for a, b, path in self._planRoads(cities):
+                start, end = path[0], path[-1]
+                LOGGER.debug("Road %s -> %s, %d squares", start, end, len(path))
+                cities[a].addRoad(start, end, path)
+                cities[b].addRoad(end, start, path)
+                for i, j in path[1:-1]:
+                    if map[i][j].peek() is not ROAD: map[i][j].putOnTop(ROAD)
 
         LOGGER.debug("Filling in trees...")
-        for i in range(M):
-            for j in range(N):
-                tree = Tree(self)
-                self.trees.append(tree)
-                if not map[i][j].peek(): map[i][j].putOnTop(tree)
+        with stats.phase("gen.trees"):
+            for i in range(M):
+                for j in range(N):
+                    if not map[i][j].peek(): map[i][j].putOnTop(TREE)
 
+        with stats.phase("gen.frontiers"):
+            if self.board: self.board.freeze(cities)
+            else:
+                for city in cities: city.rebuildFrontier()
         return cities
 
     def peekCell(self, i: int, j: int) -> Union[object, None]:
         "Get the top most elem of the cell on the map at provided position"
+        if self.board: return self.board.peek(i, j)
         return self.map[i][j].peek()
 
     def peekCellBase(self, i: int, j: int) -> Union[object, None]:
         "Get the bottom most elem of the cell on the map at provided position"
+        if self.board: return self.board.peekBase(i, j)
         return self.map[i][j].peekBase()
 
     def popFromMap(self, pos: Tuple[int,int]) -> object:
         """pop the most top element at `pos` from the map"""
-        return self.map[pos[0]][pos[1]].pop()
+        elem = self.map[pos[0]][pos[1]].pop()
+        self._cellChanged(pos, elem)
+        return elem
 
     def putOnMap(self, pos: Tuple[int, int], value: Any) -> bool:
         """put an element on the most top at `pos` from the map"""
-        self.map[pos[0]][pos[1]].putOnTop(value)
+        if not self.map[pos[0]][pos[1]].putOnTop(value): return False
+        self._cellChanged(pos, added=value)
+        return True
 
     def moveTopElemOnMapTo(self, original_pos: Tuple[int, int], new_pos: Tuple[int, int]):
         """Pop the top most element at position on the map
@@ -267,85 +509,193 @@ class Purge():
         "Directly remove an element from cell at provided position on the map"
         if k not in (cell:=self.map[i][j]).stk: raise RuntimeError(f"Cell ({i},{j}) does not have element: {k.__class__}")
         cell.directRemove(k)
+        self._cellChanged((i, j), k)
 
     def removeTypeFromCell(self, k: type, i: int, j: int) -> None:
         "Directly remove a type from cell at provided position on the map"
-        for elem in (cell:=self.map[i][j]).stk:
+        for elem in list((cell:=self.map[i][j]).stk):
             if type(elem) == k:
                 cell.directRemove(elem)
+                self._cellChanged((i, j), elem)
+
+    def _cellChanged(self, pos: Tuple[int, int], removed: object=None, added: object=None) -> None:
+        """Keep the disease registry, the cities' disease frontiers and infection counters up to date
+            after the cell at `pos` changed
+        ## params
+            - `removed`: the element taken off the cell, if any
+            - `added`: the element put on the cell, if any
+        """
+        if self.stats.enabled: self._countChange(removed, added)
+        if isType(city:= self.peekCellBase(*pos), City):
+            if isType(removed, Disease):
+                city.frontier.discard(removed)
+                self.diseaseSeeds.remove(removed, city)
+                self._countInfection(city, -1)
+            if isType(added, Disease):
+                self.diseaseSeeds.add(added, city)
+                self._countInfection(city, 1)
+        # ◼︎ an `ArrayBoard` finds the frontier from its layers when asked, see `City.edgeDiseases`
+        if self.board: return
+        self._updateFrontierAt(*pos)
+        for ni, nj in self.stencils.adjacent(*pos):
+            self._updateFrontierAt(ni, nj)
+
+    def _countChange(self, removed: object, added: object) -> None:
+        stats = self.stats
+        stats.count("cellsTouched")
+        if isType(removed, Disease): stats.count("diseasesCured")
+        if isType(added, Disease): stats.count("diseasesSpawned")
+
+    def _countInfection(self, city: City, delta: int) -> None:
+        city.infectedCnt += delta
+        if city.isOverrun: self.overRunCities.add(city)
+        else: self.overRunCities.discard(city)
+
+    def _updateFrontierAt(self, i: int, j: int) -> None:
+        if isType(city:= self.peekCellBase(i, j), City): city.updateFrontier((i, j))
+
+    def checkFrontiers(self) -> None:
+        "Compare every city's frontier against a full rescan, raise `RuntimeError` on mismatch"
+        for city in self.cities:
+            if set(tracked:= city.edgeDiseases) != set(scanned:= city.scanEdgeDiseases()):
+                raise RuntimeError(f"Frontier of city at {city.root} is out of date: "
+                                   f"tracked {sorted(d.root for d in tracked)}, "
+                                   f"scanned {sorted(d.root for d in scanned)}")
     
+    def clone(self, seed: int=None) -> Purge:
+        """Copy the game for lookahead: the copy plays on without touching this one
+            The geometry of the cities, the roads and their route tables (and the
+            static layers of an `ArrayBoard`) are shared, only the mutable state is
+            copied: cities' infection, diseases, pawns, timers and random streams.
+            `rng` and `genRng` are only drawn while generating the map so they are 
+            shared as well. An `ArrayBoard` game copies a few arrays. The rows of a 
+            `Cell` map are shared by both games as `SharedRow`s, each game copies a 
+            row the first time it reads or writes it
+        ## params
+            - `seed`: restart the disease spreading and `aiRng` of the copy from 
+              `seed` instead of copying their state, cheaper when the copy is 
+              meant to sample other outcomes anyway
+        """
+        purge = Purge.__new__(Purge)
+        purge.M, purge.N, purge.city_count, purge.city_size = self.M, self.N, self.city_count, self.city_size
+        purge.stencils = self.stencils
+        purge.seed, purge.rng, purge.genRng = self.seed, self.rng, self.genRng
+        if seed is None:
+            purge.spreadRng, purge.aiRng = random.Random(), random.Random()
+            purge.spreadRng.setstate(self.spreadRng.getstate())
+            purge.aiRng.setstate(self.aiRng.getstate())
+        else:
+            purge.spreadRng = random.Random(seed)
+            purge.aiRng = random.Random(purge.spreadRng.getrandbits(64))
+        purge.stats = Stats(self.stats.enabled)
+        purge.journal, purge.debugFrontier = None, self.debugFrontier
+        purge.trees = list(self.trees)
+
+        # ◼︎ copies of the cities, diseases and pawns, keyed by `id` of the original
+        memo: Dict[int, object] = {}
+        purge.cities = cities = []
+        for city in self.cities:
+            cities.append(twin:= city.copyFor(purge))
+            memo[id(city)] = twin
+        purge.diseaseSeeds = registry = DiseaseRegistry()
+        byPos = registry.byPos
+        for pos, d in self.diseaseSeeds.byPos.items():
+            twin = memo[id(d)] = byPos[pos] = Disease.__new__(Disease)
+            twin.root, twin.purgeRef = pos, purge
+        for city, diseases in self.diseaseSeeds.byCity.items():
+            registry.byCity[memo[id(city)]] = {pos: memo[id(d)] for pos, d in diseases.items()}
+        for city, twin in zip(self.cities, cities):
+            twin.frontier = IndexedSet([memo[id(d)] for d in city.frontier])
+        purge.overRunCities = {memo[id(city)] for city in self.overRunCities}
+
+        memo[id(self.doctor)] = purge.doctor = Doctor(purge, self.doctor.root)
+        memo[id(self.knight)] = purge.knight = Knight(purge, self.knight.root)
+        purge.nurses = []
+        for nurse in self.nurses:
+            if nurse is not None:
+                i, j = nurse.root
+                twin = memo[id(nurse)] = Nurse(purge, (i + nurse.delta[0], j + nurse.delta[1]), nurse.root)
+                twin.counter = nurse.counter
+                purge.nurses.append(twin)
+            else:
+                purge.nurses.append(None)
+
+        # ◼︎ board and clock
+        timers = purge.timers = CellTimers()
+        timers.round = self.timers.round
+        if self.board:
+            purge.board = self.board.copyFor(purge, memo)
+            purge.map = purge.board.grid
+        else:
+            purge.board, purge.map, memos = None, [], {}
+            for i, row in enumerate(self.map):
+                if type(row) is SharedRow:
+                    # ◼︎ not copied by this game yet, its objects are mapped through both games
+                    source, rowMemo = row.source, row.memo
+                    if rowMemo is None: rowMemo = memo
+                    elif (rowMemo:= memos.get(id(row.memo))) is None:
+                        rowMemo = memos[id(row.memo)] = {k: memo.get(id(v), v) for k, v in row.memo.items()}
+                else:
+                    source, rowMemo = row, memo
+                    self.map[i] = SharedRow(self, i, row)
+                purge.map.append(SharedRow(purge, i, source, rowMemo))
+
+        purge._roadNetwork = None if self._roadNetwork is None else self._roadNetwork.rebind(cities)
+        purge.renderer = Renderer(purge)
+        return purge
+
     def roundEnd(self, actualEnd=True) -> int:
         """Mark the end of a full turn end for the current purge game
             Should be called after each player finish their turn
         ### return
             - bool: win=1, lose=-1, still_playing=0
         """
-        overRunCities = set()
-        if actualEnd:
-            # ◼︎ processing diseases
-            for city in self.cities:
-                if (seeds:=city.edgeDiseases):
-                    pickedDisease_seed = random.choice(seeds)
-                    pickedDisease_seed.growToAdjacent()
-                if city.getInfectPercentage() > 0.6:
-                    overRunCities.add(city)
-                elif city in overRunCities:
-                    overRunCities.remove(city)
-
-            for row in self.map:
-                for cell in row:
-                    cell.turnEnd()
-
-            for nurse in self.nurses:
-                if isType(nurse, Nurse): nurse.turnEnd()
+        stats = self.stats
+        if stats.enabled: stats.count("rounds" if actualEnd else "halfRounds")
+        if self.debugFrontier:
+            with stats.phase("round.frontierCheck"): self.checkFrontiers()
 
-        
+        if actualEnd:
+            # ◼︎ processing diseases, each city picks after the growth of the ones before it
+            with stats.phase("round.spread"):
+                for city in self.cities:
+                    if (seeds:=city.edgeDiseases):
+                        pickedDisease_seed = self.spreadRng.choice(seeds)
+                        pickedDisease_seed.growToAdjacent()
+
+            with stats.phase("round.timers"):
+                self.timers.advance()
+
+            with stats.phase("round.nurses"):
+                for nurse in self.nurses:
+                    if isType(nurse, Nurse): nurse.turnEnd()
+
+        if self.debugFrontier:
+            with stats.phase("round.frontierCheck"): self.checkFrontiers()
         
         # ◼︎ checking win/lose condition
-        if len(overRunCities) == self.city_count:
-            return -1
+        status = 0
+        if actualEnd and len(self.board.overrunCities() if self.board else self.overRunCities) == self.city_count:
+            status = -1
         elif len(self.diseaseSeeds) == 0:
-            return 1
-        return 0
-
+            status = 1
+        if self.journal: self.journal.record("roundEnd", None, actualEnd, status)
+        return status
 
-    def showMap(self):
-        """Display the current map and the status of the game so far"""
-        cls = self.__class__
-        map = self.map
-        M, N = self.M, self.N
 
-        print(" " * ALIGN, end="")
-        for cIdx in range(N):
-            print(f"{cIdx:<{ALIGN}}", end="")
-        print()
-
-        for i in range(M):
-            print(f"{i:<{ALIGN}}", end="")
-            for j in range(N):
-                mostTopObj = map[i][j].peek()
-                ch = " "
-                if isType(mostTopObj, City):
-                    ch = ecbCh_gate if mostTopObj.isGate(i, j) else ecbCh
-                    if not map[i][j].canBeUpdate:
-                        ch = f"{TermArtist.MEGANTA}{ch}{TermArtist.RESET}"
-                    else:
-                        ch = f"{TermArtist.YELLOW}{ch}{TermArtist.RESET}"
-                elif isType(mostTopObj, Doctor):
-                    ch = docCh
-                elif isType(mostTopObj, Nurse):
-                    ch = nurseCh
-                elif isType(mostTopObj, Knight):
-                    ch = knightCh
-                elif isType(mostTopObj, Disease):
-                    ch = disCh
-                elif isType(mostTopObj, Tree):
-                    ch = treeCh
-                elif isType(mostTopObj, Road):
-                    ch = roadCh
-
-                print(f"{ch:<{ALIGN-1}}", end="")
-            print()
+    @property
+    def roadNetwork(self) -> RoadNetwork:
+        "Gate-to-gate road graph and route table of the map, built on first use after `Snapshot.load`"
+        if self._roadNetwork is None: self._roadNetwork = RoadNetwork(self.cities)
+        return self._roadNetwork
+
+    def showMap(self, full: bool=False):
+        """Display the current map, only redrawing the squares that changed 
+            since the last call when the output is a terminal (see `Renderer`)
+        ## params
+            - `full`: redraw the whole map
+        """
+        self.renderer.draw(full)
 
 
 # =============================
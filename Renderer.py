@@ -0,0 +1,166 @@
+"""
+Terminal renderer of a Purge map.
+
+A frame is built as a list of glyphs, one per square, looked up in `GLYPHS`
+by the state of the square. The whole frame is written with a single write.
+A caller that owns the whole terminal screen can turn on diffing: the previous
+frame is kept and the next draw only moves the cursor to the squares that
+changed and rewrites them, so redrawing costs about the number of changed
+squares instead of the board size. Diffing is off by default, the interactive
+games print prompts under the board and read input there.
+"""
+from __future__ import annotations
+import sys, shutil
+from typing import *
+from TermArtist import TermArtist
+from Utils import *
+from Characters import *
+
+if TYPE_CHECKING:
+    from Purge import Purge
+
+ALIGN = 3
+"Text Alignment"
+
+ecbCh = f"{'□':<{ALIGN}}"
+"Empty city block character"
+ecbCh_gate = f"{TermArtist.RED}{'□':<{ALIGN}}{TermArtist.RESET}"
+"Empty city gate block character"
+disCh = f"{TermArtist.GREEN}{'✶':<{ALIGN}}{TermArtist.RESET}"
+"Disease block character"
+treeCh = f"🌲"
+"Tree block character"
+knightCh = f"{TermArtist.BLUE}{'🐴':<{ALIGN-1}}{TermArtist.RESET}"
+"Knight symbol character"
+docCh = f"{'✚':<{ALIGN}}"
+"Doctor symbol character"
+roadCh = f"{'_':<{ALIGN}}"
+"Path symbol character"
+nurseCh = f"{TermArtist.BLUE}{'✚':<{ALIGN}}{TermArtist.RESET}"
+
+CELL_WIDTH = ALIGN
+"Terminal columns taken by one square"
+
+def _glyph(ch: str) -> str:
+    return f"{ch:<{ALIGN-1}}"
+
+GLYPHS: Dict[Any, str] = {
+    None:     _glyph(" "),
+    Doctor:   _glyph(docCh),
+    Nurse:    _glyph(nurseCh),
+    Knight:   _glyph(knightCh),
+    Disease:  _glyph(disCh),
+    Tree:     _glyph(treeCh),
+    Road:     _glyph(roadCh),
+    # ◼︎ city squares: (City, is a gate, can be updated)
+    (City, False, True):  _glyph(f"{TermArtist.YELLOW}{ecbCh}{TermArtist.RESET}"),
+    (City, True, True):   _glyph(f"{TermArtist.YELLOW}{ecbCh_gate}{TermArtist.RESET}"),
+    (City, False, False): _glyph(f"{TermArtist.MEGANTA}{ecbCh}{TermArtist.RESET}"),
+    (City, True, False):  _glyph(f"{TermArtist.MEGANTA}{ecbCh_gate}{TermArtist.RESET}"),
+}
+"Glyph of a square keyed by its state: the type of its top most element, or a tuple for city squares"
+
+
+class Renderer():
+    """
+    Draws the map of a Purge game. Every frame is written in full unless
+    diffing was turned on, frames are then diffed against the previous one.
+    """
+    FULL_REDRAW_RATIO = 0.5
+    "Write a full frame when more than this share of the squares changed"
+
+    def __init__(self, purge: Purge, out: TextIO=None, diff: bool=False) -> None:
+        """
+        ## params
+            - `out`: stream to draw to, `sys.stdout` at the time of drawing if not provided
+            - `diff`: send only the changed squares, for callers that own the whole screen.
+              `None` to diff only when `out` is a terminal big enough for the board
+        """
+        self.purgeRef = purge
+        "The Purge game being drawn"
+        self.out = out
+        "Stream to draw to, `None` for `sys.stdout`"
+        self.diff = diff
+        "Send only the changed squares, `None` to decide from `out`"
+        self.prev: List[str] = None
+        "Glyphs of the frame on screen, `None` when the next draw must be a full frame"
+        self._keys: Dict[type, Any] = {}
+        "Glyph key of each top most element type met so far"
+
+    def _key(self, top: object) -> Any:
+        "Glyph key of a type, resolving subclasses once"
+        cls = type(top)
+        if (key:= self._keys.get(cls)) is None:
+            key = next((k for k in (City, Doctor, Nurse, Knight, Disease, Tree, Road) if isinstance(top, k)), None)
+            self._keys[cls] = key
+        return key
+
+    def frame(self) -> List[str]:
+        "Glyphs of every square in row-major order"
+        purge, map, glyphs = self.purgeRef, self.purgeRef.map, GLYPHS
+        res = []
+        for i in range(purge.M):
+            row = map[i]
+            for j in range(purge.N):
+                cell = row[j]
+                top = cell.peek()
+                key = None if top is None else self._key(top)
+                if key is City: key = (City, top.isGate(i, j), cell.canBeUpdate)
+                res.append(glyphs[key])
+        return res
+
+    def fullFrame(self, frame: List[str]) -> str:
+        "Text of a whole frame: the column numbers then one line per row"
+        M, N = self.purgeRef.M, self.purgeRef.N
+        lines = [" " * ALIGN + "".join(f"{cIdx:<{ALIGN}}" for cIdx in range(N))]
+        for i in range(M):
+            lines.append(f"{i:<{ALIGN}}" + "".join(frame[i*N:(i+1)*N]))
+        return "\n".join(lines) + "\n"
+
+    def diffFrame(self, frame: List[str], changed: List[int]) -> str:
+        """Escape sequences rewriting the `changed` squares (flat indices) of
+            `frame`, the board being drawn from the top left corner of the screen,
+            then clear the screen under the board
+        """
+        M, N = self.purgeRef.M, self.purgeRef.N
+        parts = []
+        for k in changed:
+            i, j = divmod(k, N)
+            parts.append(f"\033[{i + 2};{ALIGN + j*CELL_WIDTH + 1}H{frame[k]}")
+        # ◼︎ leave the cursor on the line after the board, where a full frame leaves it
+        parts.append(f"\033[{M + 2};1H\033[J")
+        return "".join(parts)
+
+    def _canDiff(self, out: TextIO) -> bool:
+        if self.diff is not None: return self.diff
+        if not (hasattr(out, "isatty") and out.isatty()): return False
+        return shutil.get_terminal_size().lines > self.purgeRef.M + 2
+
+    def invalidate(self) -> None:
+        "Make the next draw a full frame, e.g. after something else was printed over the board"
+        self.prev = None
+
+    def draw(self, full: bool=False) -> int:
+        """Draw the current map with a single write
+        ## params
+            - `full`: write the whole frame even if a diff is possible
+        ### return
+            - `int`: number of squares written
+        """
+        out = self.out or sys.stdout
+        frame, diff, prev = self.frame(), self._canDiff(out), self.prev
+        changed = None
+        if diff and not full and prev is not None and len(prev) == len(frame):
+            changed = [k for k in range(len(frame)) if prev[k] != frame[k]]
+            if len(changed) > self.FULL_REDRAW_RATIO * len(frame): changed = None
+
+        if changed is None:
+            text = self.fullFrame(frame)
+            # ◼︎ when diffing, clear the screen and draw from the top left corner
+            if diff: text = "\033[2J\033[H" + text
+        else:
+            text = self.diffFrame(frame, changed)
+        out.write(text)
+        out.flush()
+        self.prev = frame if diff else None
+        return len(frame) if changed is None else len(changed)
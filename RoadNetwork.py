@@ -0,0 +1,179 @@
+"""
+Road network index of a Purge map.
+
+Road geometry does not change once `Purge._generateMap` is done, so the gates
+and roads are indexed a single time: gates are the nodes, roads and walks
+across a city are the weighted edges. A next-hop table over all gate pairs
+turns "how do I get from here to city X" into a lookup.
+"""
+from __future__ import annotations
+import heapq
+from collections import deque
+from typing import *
+from Utils import *
+
+if TYPE_CHECKING:
+    from Characters import City
+
+
+class CityLookup():
+    """Read-only mapping from a city square to the city owning it. The squares
+        are indexed by city number, so copies of a game share the index
+    """
+    __slots__ = ("index", "cities")
+
+    def __init__(self, index: Dict[Tuple[int, int], int], cities: List[City]) -> None:
+        self.index = index
+        "City number of each city square"
+        self.cities = cities
+
+    def get(self, pos: Tuple[int, int], default: Any=None) -> Union[City, Any]:
+        return default if (k:= self.index.get(pos)) is None else self.cities[k]
+
+    def __getitem__(self, pos: Tuple[int, int]) -> City:
+        return self.cities[self.index[pos]]
+
+    def __contains__(self, pos: Tuple[int, int]) -> bool:
+        return pos in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class RoadNetwork():
+    """
+    Gate-to-gate road graph of a Purge map and the all-pairs route table.
+    Edge weights are in moves: walking a square inside a city costs one move,
+    taking a road from a gate also costs one move whatever its length.
+    """
+    def __init__(self, cities: List[City]) -> None:
+        self.cities = cities
+        "City objects of the map, a city's index in here is used by the route tables"
+        self.cityIdx: Dict[City, int] = {city: k for k, city in enumerate(cities)}
+        "Reverse lookup of `cities`"
+        self.cityAt = CityLookup({pos: k for k, city in enumerate(cities) for pos in city.cells_pos}, cities)
+        "The city owning each city square"
+        self.gates: List[Tuple[int, int]] = [pos for city in cities for pos in city.gatePositions]
+        "Gate positions, a gate's index in here is its node id"
+        self.gateIdx: Dict[Tuple[int, int], int] = {pos: k for k, pos in enumerate(self.gates)}
+        "Reverse lookup of `gates`"
+        self.roadLength: Dict[Tuple[Tuple[int, int], Tuple[int, int]], int] = {}
+        "Number of road squares between two gates, keyed by (gate, other gate)"
+        self._inCity: List[Dict[Tuple[int, int], Dict[Tuple[int, int], int]]] = [{} for _ in cities]
+        "Per city cache of walking distances inside the city, keyed by source square"
+
+        # ◼︎ edges: node id -> [(node id, weight)]
+        edges: List[List[Tuple[int, int]]] = [[] for _ in self.gates]
+        for city in cities:
+            cityGates = list(city.gatePositions)
+            for g in cityGates:
+                dist = self.distancesInCity(city, g)
+                for h in cityGates:
+                    if h != g and h in dist: edges[self.gateIdx[g]].append((self.gateIdx[h], dist[h]))
+                for end, path in city.roadsTo[g]:
+                    self.roadLength[(g, end)] = len(path) - 1
+                    edges[self.gateIdx[g]].append((self.gateIdx[end], 1))
+
+        # ◼︎ all pairs shortest paths, one dijkstra per gate
+        G = len(self.gates)
+        self.dist: List[List[float]] = []
+        "Moves between two gates, `dist[g][h]`"
+        self.nextHop: List[List[int]] = []
+        "Node id of the first hop on the way from gate `g` to gate `h`, `nextHop[g][h]`"
+        for src in range(G):
+            dist, first = [float("inf")] * G, [-1] * G
+            dist[src], first[src] = 0, src
+            minQ = [(0, src)]
+            while minQ:
+                d, u = heapq.heappop(minQ)
+                if d > dist[u]: continue
+                for v, w in edges[u]:
+                    if d + w < dist[v]:
+                        dist[v] = d + w
+                        first[v] = v if u == src else first[u]
+                        heapq.heappush(minQ, (dist[v], v))
+            self.dist.append(dist)
+            self.nextHop.append(first)
+
+        # ◼︎ gate to city: reaching any gate of the city is enough
+        C = len(cities)
+        self.cityDist: List[List[float]] = [[float("inf")] * C for _ in range(G)]
+        "Moves from gate `g` to the closest gate of city `c`, `cityDist[g][c]`"
+        self.cityNext: List[List[int]] = [[-1] * C for _ in range(G)]
+        "Node id of the first hop on the way from gate `g` to city `c`, `cityNext[g][c]`"
+        for g in range(G):
+            for h, pos in enumerate(self.gates):
+                c = self.cityIdx[self.cityAt[pos]]
+                if self.dist[g][h] < self.cityDist[g][c]:
+                    self.cityDist[g][c], self.cityNext[g][c] = self.dist[g][h], self.nextHop[g][h]
+
+    def rebind(self, cities: List[City]) -> RoadNetwork:
+        """The same network over the cities of a copy of the game, given in the
+            same order. The route tables and the walking distance caches are shared
+        """
+        net = object.__new__(RoadNetwork)
+        net.__dict__.update(self.__dict__)
+        net.cities = cities
+        net.cityIdx = {city: k for k, city in enumerate(cities)}
+        net.cityAt = CityLookup(self.cityAt.index, cities)
+        return net
+
+    def distancesInCity(self, city: City, src: Tuple[int, int]) -> Dict[Tuple[int, int], int]:
+        """Moves from `src` to every square of `city` walking only on the city,
+            computed once per source and cached
+        """
+        cache = self._inCity[self.cityIdx[city]]
+        if (dist:= cache.get(src)) is not None: return dist
+
+        dist, q = {src: 0}, deque([src])
+        while q:
+            i, j = q.popleft()
+            for di, dj in DIRECTIONS_ADJ:
+                nei = (i + di, j + dj)
+                if nei in city.cells_pos and nei not in dist:
+                    dist[nei] = dist[(i, j)] + 1
+                    q.append(nei)
+        cache[src] = dist
+        return dist
+
+    def stepInCity(self, pos: Tuple[int, int], dest: Tuple[int, int]) -> Union[Tuple[int, int], None]:
+        """The adjacent square to move to for getting closer to `dest` inside the same city
+        ### return
+            - `None` if `pos` is already at `dest` or cannot reach it
+        """
+        city = self.cityAt.get(pos)
+        if city is None or pos == dest: return None
+        dist = self.distancesInCity(city, dest)
+        if pos not in dist: return None
+        for di, dj in DIRECTIONS_ADJ:
+            nei = (pos[0] + di, pos[1] + dj)
+            if dist.get(nei, -1) == dist[pos] - 1: return nei
+        return None
+
+    def nextStop(self, pos: Tuple[int, int], targetCity: City) -> Union[Tuple[int, int], None]:
+        """Where to head for next on the way from `pos` to `targetCity`
+        ### return
+            - a gate of the current city if `pos` should walk to it first
+            - the gate at the other end of a road, or another gate of the current city, if `pos` is a gate
+            - `None` if `pos` is already in `targetCity` or cannot reach it
+        """
+        city, c = self.cityAt.get(pos), self.cityIdx[targetCity]
+        if city is None or city is targetCity: return None
+
+        best, bestGate = float("inf"), None
+        for gate in city.gatePositions:
+            walk = self.distancesInCity(city, gate).get(pos)
+            if walk is None: continue
+            if (total:= walk + self.cityDist[self.gateIdx[gate]][c]) < best:
+                best, bestGate = total, gate
+        if bestGate is None or best == float("inf"): return None
+        if bestGate != pos: return bestGate
+        return self.gates[self.cityNext[self.gateIdx[pos]][c]]
+
+    def movesTo(self, pos: Tuple[int, int], targetCity: City) -> float:
+        "Number of moves from `pos` to the closest square of `targetCity`, `inf` if unreachable"
+        city, c = self.cityAt.get(pos), self.cityIdx[targetCity]
+        if city is None: return float("inf")
+        if city is targetCity: return 0
+        return min((self.distancesInCity(city, gate).get(pos, float("inf")) + self.cityDist[self.gateIdx[gate]][c]
+                    for gate in city.gatePositions), default=float("inf"))
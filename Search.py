@@ -0,0 +1,257 @@
+"""
+Monte Carlo tree search for the doctor and the knight.
+
+The players are on the same side and the only opponent is the random disease
+spreading, so the search plans both players' turns in one tree. A round is
+four plies: the doctor's move, the doctor's action, the knight's move and the
+knight's action, `roundEnd` running after each action ply as in
+`GameManager.twoplayers`.
+
+Every iteration clones the game with its disease spreading restarted from a
+fresh seed (see `Purge.clone`). On a large `Cell` map the search first makes
+an `ArrayBoard` copy of the game, which plays the same and is much cheaper to
+clone, and the iterations clone that copy instead. Each iteration walks down the tree picking decisions by UCB1,
+plays random turns up to `horizon` rounds and scores the position. The tree is open loop: a node is
+reached by a sequence of decisions, not by a state, so it gathers the
+outcomes of every spreading sample that followed those decisions.
+
+    mcts = MCTS(budget=0.2)
+    mcts.playTurn(purge, purge.doctor)
+"""
+from __future__ import annotations
+import math, random, time
+from typing import *
+from Purge import Purge
+from Utils import *
+from Characters import *
+from ArrayBoard import np
+import Snapshot
+
+
+class Move(NamedTuple):
+    """Where a player moves at the start of its turn"""
+    pos: Tuple[int, int] = None
+    "Square passed to `moveTo`, `None` to stay"
+    roadIdx: int = None
+    "Road taken when leaving a gate"
+
+
+class Action(NamedTuple):
+    """The action a player takes after moving"""
+    name: str
+    "Method of the pawn: cureCross, placeNurseAt, throwDisinfectantAt or switchPositionWithDoctor"
+    pos: Tuple[int, int] = None
+    "Target square of `placeNurseAt` and `throwDisinfectantAt`"
+
+
+class Turn(NamedTuple):
+    move: Move
+    action: Action
+
+
+STAY = Move()
+"Staying on the same square"
+
+DOCTOR_MOVE, DOCTOR_ACTION, KNIGHT_MOVE, KNIGHT_ACTION = range(4)
+"Plies of a round"
+
+
+# =============================
+# Decisions
+# =============================
+def legalMoves(pawn: MasterPawn) -> List[Move]:
+    """Moves `pawn` can make: staying, stepping on an adjacent free city
+        square or, from a gate, taking any of its roads
+    """
+    purge, (i, j) = pawn.purgeRef, pawn.root
+    base = purge.peekCellBase(i, j)
+    atGate = isType(base, City) and base.isGate(i, j)
+    res = [STAY]
+    for di, dj in DIRECTIONS_ADJ:
+        pos = (i + di, j + dj)
+        if not inBounds(*pos, purge.M, purge.N): continue
+        top = purge.peekCell(*pos)
+        if type(top) is City:
+            res.append(Move(pos))
+        elif atGate and isType(top, Road):
+            # ◼︎ every road of the gate can be taken from any square of road next to it, if its far gate is free
+            res.extend(Move(pos, k) for k, (end, _) in enumerate(base.roadsTo[(i, j)])
+                       if type(purge.peekCell(*end)) is City)
+            atGate = False
+    return res
+
+
+def legalActions(pawn: MasterPawn) -> List[Action]:
+    """Actions `pawn` can take, leaving out disinfectant throws that would
+        not reach a city square
+    """
+    if isType(pawn, Doctor):
+        return [Action("cureCross"), *(Action("placeNurseAt", pos) for pos in pawn.nursePositions())]
+
+    purge = pawn.purgeRef
+    res = [Action("switchPositionWithDoctor")]
+    for ci, cj in pawn.disinfectantPositions():
+        if any(isType(purge.peekCellBase(*pos), City) for pos in purge.stencils.area(ci, cj)):
+            res.append(Action("throwDisinfectantAt", (ci, cj)))
+    return res
+
+
+def applyMove(pawn: MasterPawn, move: Move) -> None:
+    if move.pos is not None: pawn.moveTo(move.pos, move.roadIdx)
+
+
+def applyAction(pawn: MasterPawn, action: Action) -> None:
+    method = getattr(pawn, action.name)
+    if action.pos is None: method()
+    else: method(action.pos)
+
+
+# =============================
+# Search
+# =============================
+class Node():
+    """Statistics of a sequence of decisions"""
+    __slots__ = ("visits", "value", "children")
+
+    def __init__(self) -> None:
+        self.visits = 0
+        self.value = 0.0
+        "Sum of the scores of the iterations through this node"
+        self.children: Dict[Union[Move, Action], Node] = {}
+
+
+class MCTS():
+    """
+    Plans the turns of both players within a wall-clock budget per decision
+    """
+    ARRAY_ROLLOUTS_FROM = 32 * 32
+    "Squares of a `Cell` map from which the iterations play on an `ArrayBoard` copy"
+
+    def __init__(self, budget: float=0.5, horizon: int=4, exploration: float=0.7,
+                 iterations: int=None, seed: int=None) -> None:
+        """
+        ## params
+            - `budget`: seconds spent on each decision
+            - `horizon`: rounds played from the current one before a position is scored
+            - `exploration`: UCB1 exploration constant
+            - `iterations`: stop after this many iterations even if time is left,
+              with `budget=math.inf` the search does the same work on every run
+            - `seed`: seed of the search's own random stream
+        """
+        self.budget = budget
+        self.horizon = horizon
+        self.exploration = exploration
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        "Random stream of the search: spreading seeds, expansions and random turns"
+        self.lastIterations = 0
+        "Iterations run by the last search"
+        self.lastSeconds = 0.0
+        "Seconds taken by the last search"
+
+    def search(self, purge: Purge, ply: int, root: Node=None) -> Node:
+        """Grow a tree of the decisions from `ply` of the current round
+        ## params
+            - `root`: tree to grow further, a new one if not provided
+        ### return
+            - the root of the tree
+        """
+        root = root or Node()
+        rng = self.rng
+        base = self.rolloutGame(purge)
+        maxPly = self.horizon * 4
+        scale = len(purge.diseaseSeeds) + 1
+        start = time.perf_counter()
+        deadline, n = start + self.budget, 0
+
+        while n < (self.iterations or math.inf):
+            if n and time.perf_counter() >= deadline: break
+            n += 1
+            game = base.clone(rng.getrandbits(64))
+
+            # ◼︎ selection and expansion
+            node, path, cur, status = root, [root], ply, 0
+            for depth in range(maxPly):
+                options = self._options(game, cur)
+                fresh = [o for o in options if o not in node.children]
+                if fresh:
+                    choice = rng.choice(fresh)
+                    node.children[choice] = child = Node()
+                else:
+                    choice = max(options, key=lambda o: self._ucb(node, node.children[o]))
+                    child = node.children[choice]
+                status = self._step(game, cur, choice)
+                cur, node = (cur + 1) % 4, child
+                path.append(node)
+                if fresh or status: break
+
+            # ◼︎ random turns up to the horizon
+            for depth in range(depth + 1, maxPly):
+                if status: break
+                status = self._step(game, cur, rng.choice(self._options(game, cur)))
+                cur = (cur + 1) % 4
+
+            score = self.evaluate(game, status, scale)
+            for node in path:
+                node.visits += 1
+                node.value += score
+
+        self.lastIterations, self.lastSeconds = n, time.perf_counter() - start
+        return root
+
+    def rolloutGame(self, purge: Purge) -> Purge:
+        """The game cloned by every iteration: `purge` itself, or an `ArrayBoard`
+            copy of a large `Cell` map, made once per search
+        """
+        if purge.board or np is None or purge.M * purge.N < self.ARRAY_ROLLOUTS_FROM: return purge
+        return Snapshot.loads(Snapshot.dumps(purge), array_board=True)
+
+    def _ucb(self, parent: Node, child: Node) -> float:
+        return child.value / child.visits + self.exploration * math.sqrt(math.log(parent.visits) / child.visits)
+
+    @staticmethod
+    def _options(game: Purge, ply: int) -> List[Union[Move, Action]]:
+        pawn = game.doctor if ply < KNIGHT_MOVE else game.knight
+        return legalMoves(pawn) if ply % 2 == 0 else legalActions(pawn)
+
+    @staticmethod
+    def _step(game: Purge, ply: int, choice: Union[Move, Action]) -> int:
+        "Play one ply, ending the round after an action"
+        pawn = game.doctor if ply < KNIGHT_MOVE else game.knight
+        if ply % 2 == 0:
+            applyMove(pawn, choice)
+            return 0
+        applyAction(pawn, choice)
+        return game.roundEnd(ply == KNIGHT_ACTION)
+
+    @staticmethod
+    def evaluate(game: Purge, status: int, scale: int) -> float:
+        """Score of a position between 0 and 1: 1 for a win, 0 for a loss,
+            otherwise lower with every overrun city and as the diseases grow
+            compared to `scale`
+        """
+        if status: return 1.0 if status == 1 else 0.0
+        standing = 1 - len(game.overRunCities) / game.city_count
+        return standing / (1 + len(game.diseaseSeeds) / scale)
+
+    @staticmethod
+    def best(node: Node, options: List[Union[Move, Action]]) -> Union[Move, Action]:
+        "The most visited of the legal `options`, the first one if none was visited"
+        return max(options, key=lambda o: (c:= node.children.get(o)) and c.visits or 0)
+
+    def playTurn(self, purge: Purge, pawn: MasterPawn) -> Turn:
+        """Search and play the turn of `pawn` (the doctor or the knight) on
+            `purge`, without ending the round. The action is searched again
+            after moving, growing the subtree of the chosen move
+        ### return
+            - the played turn
+        """
+        ply = DOCTOR_MOVE if pawn is purge.doctor else KNIGHT_MOVE
+        root = self.search(purge, ply)
+        move = self.best(root, legalMoves(pawn))
+        applyMove(pawn, move)
+
+        sub = self.search(purge, ply + 1, root.children.get(move))
+        action = self.best(sub, legalActions(pawn))
+        applyAction(pawn, action)
+        return Turn(move, action)
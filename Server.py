@@ -0,0 +1,381 @@
+"""
+asyncio server hosting many Purge games in one process.
+
+Clients speak JSON lines over TCP or a Unix socket: every request is one JSON
+object on one line with an `op` and, for a game, its `session`; every
+response is one line echoing the request's `id`:
+
+    {"id": 1, "op": "new", "size": [12, 12], "cities": 3, "city_size": 15, "seed": 7}
+    {"id": 1, "ok": true, "session": 1, "state": {...}}
+    {"id": 2, "op": "move", "session": 1, "dir": "w"}
+    {"id": 3, "op": "action", "session": 1, "name": "placeNurseAt", "pos": [4, 6]}
+    {"id": 4, "op": "oops"}
+    {"id": 4, "ok": false, "error": "unknown op 'oops'"}
+
+A game follows the turns of `GameManager.twoplayers`: the doctor moves (or
+sacrifices the move for a second action) then acts, the half round ends, the
+knight does the same and the round ends. The server never prompts: a move
+from a gate onto a road takes road `road`, the first one by default.
+
+Requests of a connection run concurrently and the requests of a game one at a
+time. Moves and actions are played on the event loop as they take
+microseconds; generating a map, searching an AI turn and forecasting run in a
+thread pool. A game belongs to the connection that created it and is closed
+with it.
+
+    python Server.py --unix /tmp/purge.sock
+    python LoadTest.py --unix /tmp/purge.sock -c 50 -n 2000
+"""
+from __future__ import annotations
+import os, argparse, asyncio, json, itertools, math
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+from Purge import Purge
+from Utils import *
+from Characters import *
+from Search import MCTS, Move, legalMoves, legalActions, DOCTOR_MOVE, DOCTOR_ACTION, KNIGHT_MOVE, KNIGHT_ACTION
+
+MAX_LINE = 1 << 16
+"Longest request line accepted, in bytes"
+MAX_INFLIGHT = 64
+"Requests of one connection processed at the same time, the next ones wait to be read"
+MAX_FORECAST_ROUNDS = 50
+"Most rounds a `forecast` request plays, longer ones are cut down to it"
+MAX_FORECAST_FUTURES = 4096
+"Most futures a `forecast` request plays, more are cut down to it"
+MAX_FORECAST_SQUARES = 1 << 24
+"Most futures times board squares a `forecast` request plays, on large boards the futures are cut down to fit"
+
+DIRECTIONS = dict(zip(["s", "w", "d", "a"], DIRECTIONS_ADJ))
+"Direction letters of `MasterPawn.moveDirectionalByOne`"
+
+ACTIONS = {
+    Doctor: {"cureCross", "placeNurseAt"},
+    Knight: {"throwDisinfectantAt", "switchPositionWithDoctor"},
+}
+"Actions each player may take"
+
+
+class ProtocolError(Exception):
+    """A request that cannot be played, reported to the client without closing the connection"""
+
+
+class Session():
+    """A hosted game and where it stands in the current round"""
+    __slots__ = ("id", "purge", "ply", "actionsLeft", "status", "lock", "owner")
+
+    def __init__(self, id: int, purge: Purge, owner: object) -> None:
+        self.id = id
+        self.purge = purge
+        self.ply = DOCTOR_MOVE
+        "Ply of the round being played, see `Search`"
+        self.actionsLeft = 1
+        "Actions the current player has left, 2 after sacrificing the move"
+        self.status = 0
+        "win=1, lose=-1, still_playing=0"
+        self.lock = asyncio.Lock()
+        "Held while a request plays on the game"
+        self.owner = owner
+        "Connection that created the game"
+
+    @property
+    def pawn(self) -> MasterPawn:
+        "The player whose turn it is"
+        return self.purge.doctor if self.ply < KNIGHT_MOVE else self.purge.knight
+
+    def check(self, moving: bool) -> None:
+        if self.status: raise ProtocolError("the game is over")
+        if moving != (self.ply % 2 == 0):
+            raise ProtocolError("expected an action" if moving else "expected a move")
+
+    def move(self, pos: Tuple[int, int], roadIdx: int=None) -> None:
+        "Play a move, which must be one of `Search.legalMoves`"
+        self.check(True)
+        if roadIdx is not None and not (isinstance(roadIdx, int) and roadIdx >= 0):
+            raise ProtocolError("road must be a non negative integer")
+        legal = [m for m in legalMoves(self.pawn) if m.pos == pos]
+        if not legal: raise ProtocolError(f"cannot move to {pos}")
+        # ◼︎ a move onto a road takes the first road unless told otherwise, other moves take none
+        if legal[0].roadIdx is not None and roadIdx is None: roadIdx = 0
+        if Move(pos, roadIdx) not in legal:
+            raise ProtocolError(f"no road {roadIdx} from {self.pawn.root} through {pos}")
+        if not self.pawn.moveTo(pos, roadIdx): raise ProtocolError(f"cannot move to {pos}")
+        self.ply += 1
+
+    def sacrifice(self) -> None:
+        "Give up the move for a second action, as `x` does in `GameManager`"
+        self.check(True)
+        self.ply += 1
+        self.actionsLeft = 2
+
+    def act(self, name: str, pos: Tuple[int, int]=None) -> None:
+        self.check(False)
+        pawn = self.pawn
+        if name not in ACTIONS[type(pawn)]:
+            raise ProtocolError(f"{type(pawn).__name__} cannot {name}")
+        if name == "placeNurseAt":
+            if not pawn.placeNurseAt(pos): raise ProtocolError(f"cannot place a nurse at {pos}")
+        elif name == "throwDisinfectantAt":
+            if pos not in pawn.disinfectantPositions(): raise ProtocolError(f"cannot throw at {pos}")
+            pawn.throwDisinfectantAt(pos)
+        else:
+            getattr(pawn, name)()
+        self.actionsLeft -= 1
+        if self.actionsLeft == 0: self.endTurn()
+
+    def endTurn(self) -> None:
+        "End the half round after the doctor, the round after the knight"
+        self.status = self.purge.roundEnd(self.ply == KNIGHT_ACTION)
+        self.ply = KNIGHT_MOVE if self.ply == DOCTOR_ACTION else DOCTOR_MOVE
+        self.actionsLeft = 1
+
+    def describe(self, full: bool=False, options: bool=False) -> Dict[str, Any]:
+        """State of the game as sent to clients
+        ## params
+            - `full`: add every infected position
+            - `options`: add the legal moves or actions of the current player
+        """
+        purge = self.purge
+        res = {
+            "round": purge.timers.round,
+            "status": self.status,
+            "turn": "doctor" if self.ply < KNIGHT_MOVE else "knight",
+            "phase": "move" if self.ply % 2 == 0 else "action",
+            "actionsLeft": self.actionsLeft,
+            "doctor": purge.doctor.root,
+            "knight": purge.knight.root,
+            "nurses": [nurse.root for nurse in purge.nurses if nurse is not None],
+            "diseases": len(purge.diseaseSeeds),
+            "cities": [{"root": city.root, "infected": city.getInfectPercentage(), "gates": sorted(city.gates)}
+                       for city in purge.cities],
+        }
+        if full: res["infected"] = sorted(purge.diseaseSeeds.positions)
+        if options and not self.status:
+            if self.ply % 2 == 0:
+                res["moves"] = [[*m.pos, m.roadIdx] for m in legalMoves(self.pawn) if m.pos is not None]
+            else:
+                res["actions"] = [{"name": a.name, "pos": a.pos} for a in legalActions(self.pawn)]
+        return res
+
+
+def _pos(req: Dict[str, Any], key: str="pos", required: bool=True) -> Union[Tuple[int, int], None]:
+    val = req.get(key)
+    if val is None and not required: return None
+    if not (isinstance(val, list) and len(val) == 2 and all(isinstance(v, int) for v in val)):
+        raise ProtocolError(f"{key} must be a pair of integers")
+    return tuple(val)
+
+
+class Server():
+    """
+    Hosts the games and answers the requests of every connection
+    """
+    def __init__(self, workers: int=None, maxSessions: int=100_000, maxBudget: float=2.0) -> None:
+        """
+        ## params
+            - `workers`: threads generating maps and searching AI turns
+            - `maxSessions`: games hosted at once, `new` is refused beyond
+            - `maxBudget`: most seconds an `ai` request may search
+        """
+        self.sessions: Dict[int, Session] = {}
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="purge")
+        "Runs the work too slow for the event loop"
+        self.maxSessions = maxSessions
+        self.maxBudget = maxBudget
+        self._ids = itertools.count(1)
+        self.connections = 0
+        "Connections currently open"
+        self.requests = 0
+        "Requests answered since the start"
+        self.ops: Dict[str, Callable[[Dict[str, Any], object], Awaitable[Dict[str, Any]]]] = {
+            "new": self.opNew, "state": self.opState, "move": self.opMove, "sacrifice": self.opSacrifice,
+            "action": self.opAction, "ai": self.opAi, "forecast": self.opForecast, "close": self.opClose,
+            "stats": self.opStats,
+        }
+        "Request handlers by op"
+
+    async def offload(self, fn: Callable, *args) -> Any:
+        "Run `fn` in the thread pool"
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def session(self, req: Dict[str, Any], owner: object) -> Session:
+        sess = self.sessions.get(req.get("session"))
+        if sess is None or sess.owner is not owner: raise ProtocolError(f"no session {req.get('session')}")
+        return sess
+
+    # =============================
+    # Ops
+    # =============================
+    async def opNew(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        if len(self.sessions) >= self.maxSessions: raise ProtocolError("too many sessions")
+        h, w = _pos(req, "size", required=False) or (12, 12)
+        cities, citySize = req.get("cities", 3), req.get("city_size", 15)
+        if not all(isinstance(v, int) and v > 0 for v in (h, w, cities, citySize)) or h * w > 1_000_000:
+            raise ProtocolError("size, cities and city_size must be positive, at most 1000000 squares")
+        try:
+            purge = await self.offload(lambda: Purge(h, w, cities, citySize, array_board=bool(req.get("array_board")),
+                                                     seed=req.get("seed")))
+        except RuntimeError as e: # ◼︎ the parameters do not make a playable map
+            raise ProtocolError(f"cannot generate the game: {e}") from e
+        sess = Session(next(self._ids), purge, owner)
+        self.sessions[sess.id] = sess
+        return {"session": sess.id, "state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opState(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        sess = self.session(req, owner)
+        async with sess.lock:
+            return {"state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opMove(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        sess = self.session(req, owner)
+        async with sess.lock:
+            if "dir" in req:
+                if req["dir"] not in DIRECTIONS: raise ProtocolError("dir must be one of w, a, s, d")
+                di, dj = DIRECTIONS[req["dir"]]
+                pos = (sess.pawn.root[0] + di, sess.pawn.root[1] + dj)
+            else:
+                pos = _pos(req)
+            sess.move(pos, req.get("road"))
+            return {"state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opSacrifice(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        sess = self.session(req, owner)
+        async with sess.lock:
+            sess.sacrifice()
+            return {"state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opAction(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        sess = self.session(req, owner)
+        async with sess.lock:
+            sess.act(req.get("name"), _pos(req, required=False))
+            return {"state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opAi(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        "Search and play the current player's whole turn (see `Search.MCTS`)"
+        sess = self.session(req, owner)
+        budget = float(req.get("budget", 0.2))
+        if not (math.isfinite(budget) and budget > 0): raise ProtocolError("budget must be a positive number of seconds")
+        budget = min(budget, self.maxBudget)
+        async with sess.lock:
+            sess.check(True)
+            mcts = MCTS(budget, seed=req.get("seed"))
+            turn = await self.offload(mcts.playTurn, sess.purge, sess.pawn)
+            sess.ply += 1
+            sess.endTurn()
+            return {"move": turn.move.pos, "road": turn.move.roadIdx, "action": turn.action.name,
+                    "pos": turn.action.pos, "iterations": mcts.lastIterations,
+                    "state": sess.describe(req.get("full", False), req.get("options", False))}
+
+    async def opForecast(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        "Chance of each city to be overrun within `rounds` rounds if nobody acts (see `Forecast`)"
+        from Forecast import forecast
+        sess = self.session(req, owner)
+        rounds, futures = req.get("rounds", 10), req.get("futures", 256)
+        if not all(type(v) is int and v > 0 for v in (rounds, futures)):
+            raise ProtocolError("rounds and futures must be positive integers")
+        squares = sess.purge.M * sess.purge.N
+        rounds, futures = min(rounds, MAX_FORECAST_ROUNDS), min(futures, MAX_FORECAST_FUTURES, MAX_FORECAST_SQUARES // squares)
+        async with sess.lock:
+            fc = await self.offload(forecast, sess.purge, rounds, futures, req.get("seed"))
+        return {"futures": futures, "overrun": fc.overrunProb[-1].tolist(), "infected": fc.infected[-1].tolist(),
+                "loss": float(fc.lossProb[-1]), "cleared": float(fc.clearedProb[-1])}
+
+    async def opClose(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        sess = self.session(req, owner)
+        del self.sessions[sess.id]
+        return {}
+
+    async def opStats(self, req: Dict[str, Any], owner: object) -> Dict[str, Any]:
+        return {"sessions": len(self.sessions), "connections": self.connections, "requests": self.requests}
+
+    # =============================
+    # Connections
+    # =============================
+    async def answer(self, line: bytes, owner: object) -> Dict[str, Any]:
+        "Response to one request line"
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict): raise ProtocolError("a request must be a JSON object")
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"invalid JSON: {e}"}
+        res = {"id": req.get("id"), "ok": True}
+        try:
+            handler = self.ops.get(req.get("op"))
+            if handler is None: raise ProtocolError(f"unknown op {req.get('op')!r}")
+            res.update(await handler(req, owner))
+        except (ProtocolError, TypeError, ValueError) as e:
+            res = {"id": req.get("id"), "ok": False, "error": str(e)}
+        except Exception as e:
+            LOGGER.error("%s failed: %r", req.get("op"), e)
+            res = {"id": req.get("id"), "ok": False, "error": f"internal error: {type(e).__name__}"}
+        self.requests += 1
+        return res
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        owner, pending = object(), set()
+        slots = asyncio.Semaphore(MAX_INFLIGHT)
+        self.connections += 1
+
+        async def serve(line: bytes) -> None:
+            try:
+                res = json.dumps(await self.answer(line, owner), separators=(",", ":")).encode() + b"\n"
+                if writer.is_closing(): return
+                writer.write(res)
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # ◼︎ a line over `MAX_LINE`, the stream cannot be resynchronised
+                    writer.write(b'{"id":null,"ok":false,"error":"request too long"}\n')
+                    break
+                if not line: break
+                if not line.strip(): continue
+                await slots.acquire()
+                task = asyncio.create_task(serve(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except ConnectionError:
+            pass
+        finally:
+            if pending: await asyncio.gather(*pending, return_exceptions=True)
+            for sid in [sid for sid, sess in self.sessions.items() if sess.owner is owner]:
+                del self.sessions[sid]
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, host: str="127.0.0.1", port: int=7878, unix: str=None) -> None:
+        "Accept connections until cancelled"
+        if unix:
+            if os.path.exists(unix): os.unlink(unix)
+            server = await asyncio.start_unix_server(self.handle, path=unix, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        where = unix or ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Purge server listening on {where}", flush=True)
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge game server")
+    parser.add_argument("--host", type=str, metavar="", default="127.0.0.1", help="TCP address to listen on")
+    parser.add_argument("-p", "--port", type=int, metavar="", default=7878, help="TCP port to listen on")
+    parser.add_argument("-u", "--unix", type=str, metavar="", default=None, help="Listen on this Unix socket instead")
+    parser.add_argument("-w", "--workers", type=int, metavar="", default=None, help="Threads for generation and AI turns")
+    parser.add_argument("--max_sessions", type=int, metavar="", default=100_000, help="Games hosted at once")
+    parser.add_argument("--max_budget", type=float, metavar="", default=2.0, help="Most seconds per AI turn")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(Server(args.workers, args.max_sessions, args.max_budget).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,282 @@
+"""
+Headless batch simulation of Purge games.
+
+Plays full games without rendering or prompts, with pluggable doctor and
+knight policies, and spreads them across a process pool. Used to tune the
+`Purge(h, w, city_count, city_size)` parameters:
+
+    python Simulation.py -g 2000 --size 20 20 --cities 4 --city_size 15
+"""
+from __future__ import annotations
+import os, sys, argparse, time, random, json, multiprocessing
+from typing import *
+from Purge import Purge
+from Utils import *
+from Characters import *
+from Search import MCTS
+
+
+class GameResult(NamedTuple):
+    """Outcome of a single headless game"""
+    status: int
+    "win=1, lose=-1, not finished within the round limit=0"
+    rounds: int
+    "Number of rounds played"
+    peakInfection: float
+    "Highest share of all city cells infected at the end of a round"
+    stats: Dict[str, Any] = None
+    "`Purge.stats` of the game, `None` unless asked for"
+
+
+# =============================
+# Policies
+# =============================
+class Policy():
+    """A strategy playing one player's turn (a movement and an action) without prompts"""
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        raise NotImplementedError
+
+
+def moveToward(pawn: MasterPawn, targetCity: City, targetPos: Tuple[int, int]=None) -> bool:
+    """Move `pawn` one step toward `targetPos` in `targetCity` (or toward the city
+        itself), following the game's road network
+    ### return
+        - `bool`: `True` if the pawn moved
+    """
+    purge, roads = pawn.purgeRef, pawn.purgeRef.roadNetwork
+    curCity = roads.cityAt.get(pawn.root)
+    if curCity is None: return False
+    if curCity is targetCity:
+        step = roads.stepInCity(pawn.root, targetPos) if targetPos else None
+        return step is not None and pawn.moveTo(step)
+
+    stop = roads.nextStop(pawn.root, targetCity)
+    if stop is None: return False
+    if roads.cityAt.get(stop) is curCity:
+        step = roads.stepInCity(pawn.root, stop)
+        return step is not None and pawn.moveTo(step)
+
+    # ◼︎ at a gate: step on the road leading to `stop`
+    for k, (end, path) in enumerate(curCity.roadsTo[pawn.root]):
+        if end != stop: continue
+        roadPos = path[1] if path[0] == pawn.root else path[-2]
+        return pawn.moveTo(roadPos, roadIdx=k)
+    return False
+
+
+def mostInfectedCity(purge: Purge) -> Union[City, None]:
+    "The city with the highest infected percentage that still has diseases"
+    return max((city for city in purge.cities if city.infectedCnt), key=City.getInfectPercentage, default=None)
+
+
+class IdlePolicy(Policy):
+    """Does nothing"""
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        pass
+
+
+class RandomDoctor(Policy):
+    """Moves in a random direction then cures or places a nurse at random"""
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        doctor = purge.doctor
+        doctor.moveDirectionalByOne(rng.choice("wasd"), roadIdx=0)
+        if rng.random() < 0.5 or not (spots:= doctor.nursePositions()):
+            doctor.cureCross()
+        else:
+            doctor.placeNurseAt(rng.choice(spots))
+
+
+class GreedyDoctor(Policy):
+    """Walks to the most infected city and cures there, placing nurses next
+        to diseases when curing would not remove anything
+    """
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        doctor = purge.doctor
+        if (city:= mostInfectedCity(purge)) is None: return
+        if purge.roadNetwork.cityAt.get(doctor.root) is not city or not self._crossHits(purge):
+            target = min(purge.diseaseSeeds.inCity(city), default=None,
+                         key=lambda pos: abs(pos[0] - doctor.root[0]) + abs(pos[1] - doctor.root[1]))
+            moveToward(doctor, city, target)
+
+        if self._crossHits(purge): doctor.cureCross()
+        elif (spots:= doctor.nursePositions()):
+            doctor.placeNurseAt(max(spots, key=lambda pos: self._nurseHits(purge, pos)))
+
+    @staticmethod
+    def _crossHits(purge: Purge) -> int:
+        i, j = purge.doctor.root
+        city = purge.peekCellBase(i, j)
+        return sum(1 for pos in purge.diseaseSeeds.inCity(city) if pos[0] == i or pos[1] == j)\
+               if isType(city, City) else 0
+
+    @staticmethod
+    def _nurseHits(purge: Purge, pos: Tuple[int, int]) -> int:
+        return sum(1 for di, dj in DIRECTIONS_ALL if purge.diseaseSeeds.at((pos[0] + di, pos[1] + dj)))
+
+
+class RandomKnight(Policy):
+    """Moves in a random direction then throws the disinfectant at random"""
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        knight = purge.knight
+        knight.moveDirectionalByOne(rng.choice("wasd"), roadIdx=0)
+        if (spots:= knight.disinfectantPositions()): knight.throwDisinfectantAt(rng.choice(spots))
+
+
+class DisinfectKnight(Policy):
+    """Walks to the most infected city and throws the disinfectant where it
+        protects the most uninfected city cells next to the frontier
+    """
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        knight = purge.knight
+        if (city:= mostInfectedCity(purge)) is None: return
+        if purge.roadNetwork.cityAt.get(knight.root) is not city:
+            target = next(iter(city.edgeDiseases), None)
+            moveToward(knight, city, target.root if target else None)
+
+        spots = knight.disinfectantPositions()
+        if spots: knight.throwDisinfectantAt(max(spots, key=lambda pos: self._protects(purge, pos)))
+
+    @staticmethod
+    def _protects(purge: Purge, pos: Tuple[int, int]) -> int:
+        cnt, stencils = 0, purge.stencils
+        for i, j in stencils.area(*pos):
+            if isType(purge.peekCell(i, j), City) and any(purge.diseaseSeeds.at(p) for p in stencils.adjacent(i, j)):
+                cnt += 1
+        return cnt
+
+
+class MctsPolicy(Policy):
+    """Plays the turn found by a Monte Carlo tree search (see `Search.MCTS`),
+        drawing the search's randomness from the game's `aiRng`
+    """
+    BUDGET = 0.1
+    "Default seconds per decision"
+
+    def __init__(self, budget: float=None, **kwargs) -> None:
+        self.mcts = MCTS(self.BUDGET if budget is None else budget, **kwargs)
+
+    def pawn(self, purge: Purge) -> MasterPawn:
+        raise NotImplementedError
+
+    def turn(self, purge: Purge, rng: random.Random) -> None:
+        self.mcts.rng = rng
+        self.mcts.playTurn(purge, self.pawn(purge))
+
+
+class MctsDoctor(MctsPolicy):
+    def pawn(self, purge: Purge) -> MasterPawn:
+        return purge.doctor
+
+
+class MctsKnight(MctsPolicy):
+    def pawn(self, purge: Purge) -> MasterPawn:
+        return purge.knight
+
+
+POLICIES: Dict[str, Type[Policy]] = {
+    "idle": IdlePolicy,
+    "random_doctor": RandomDoctor,
+    "greedy_doctor": GreedyDoctor,
+    "random_knight": RandomKnight,
+    "disinfect_knight": DisinfectKnight,
+    "mcts_doctor": MctsDoctor,
+    "mcts_knight": MctsKnight,
+}
+"Policies selectable by name"
+
+
+def _policy(policy: Union[str, Policy]) -> Policy:
+    return POLICIES[policy]() if isinstance(policy, str) else policy
+
+
+# =============================
+# Running games
+# =============================
+def playGame(h: int, w: int, city_count: int, city_size: int,
+             doctor: Union[str, Policy], knight: Union[str, Policy],
+             seed: int=None, maxRounds: int=500, stats: bool=False) -> GameResult:
+    """Play one full game without rendering or prompts, in the same order as
+        `GameManager.twoplayers`: doctor, `roundEnd(False)`, knight, `roundEnd()`
+    ## params
+        - `stats`: return the game's phase timings and event counters
+    """
+    purge = Purge(h, w, city_count, city_size, seed=seed, stats=stats)
+    rng = purge.aiRng
+    doctor, knight = _policy(doctor), _policy(knight)
+    totalCells = sum(len(city.cells_pos) for city in purge.cities)
+
+    status, peak = 0, len(purge.diseaseSeeds) / totalCells
+    for rounds in range(1, maxRounds + 1):
+        doctor.turn(purge, rng)
+        if (status:= purge.roundEnd(False)): break
+        knight.turn(purge, rng)
+        status = purge.roundEnd()
+        peak = max(peak, len(purge.diseaseSeeds) / totalCells)
+        if status: break
+    return GameResult(status, rounds, peak, purge.stats.toDict() if stats else None)
+
+
+def _playJob(job: Tuple) -> GameResult:
+    return playGame(*job)
+
+
+def simulate(games: int, h: int=20, w: int=20, city_count: int=4, city_size: int=15,
+             doctor: Union[str, Policy]="greedy_doctor", knight: Union[str, Policy]="disinfect_knight",
+             seed: int=0, maxRounds: int=500, processes: int=None, stats: bool=False) -> Dict[str, Any]:
+    """Play `games` games across a process pool and aggregate the results
+    ## params
+        - `doctor`, `knight`: a `Policy` instance or a name in `POLICIES`
+        - `seed`: game `k` is played with seed `seed + k`
+        - `processes`: pool size, defaults to the number of cores
+        - `stats`: add the phase timings and event counters summed over the games
+    ### return
+        - win rate, rounds to finish and peak infection of the batch
+    """
+    jobs = [(h, w, city_count, city_size, doctor, knight, seed + k, maxRounds, stats) for k in range(games)]
+    processes = processes or os.cpu_count()
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_playJob(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, games // (processes * 8))
+            results = list(pool.imap_unordered(_playJob, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    finished = [r for r in results if r.status != 0]
+    report = {
+        "games": games,
+        "wins": sum(r.status == 1 for r in results),
+        "losses": sum(r.status == -1 for r in results),
+        "unfinished": games - len(finished),
+        "winRate": sum(r.status == 1 for r in results) / games if games else 0.0,
+        "meanRounds": sum(r.rounds for r in finished) / len(finished) if finished else None,
+        "meanPeakInfection": sum(r.peakInfection for r in results) / games if games else 0.0,
+        "maxPeakInfection": max((r.peakInfection for r in results), default=0.0),
+        "seconds": elapsed,
+        "gamesPerSecond": games / elapsed if elapsed else None,
+    }
+    if stats:
+        total = Stats()
+        for r in results: total.merge(r.stats)
+        report["stats"] = total.toDict()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge headless simulations")
+    parser.add_argument("-g", "--games", type=int, metavar="", default=1000, help="Number of games")
+    parser.add_argument("--size", type=int, nargs=2, metavar="", default=[20, 20], help="Map height and width")
+    parser.add_argument("--cities", type=int, metavar="", default=4, help="City count")
+    parser.add_argument("--city_size", type=int, metavar="", default=15, help="Each city's size")
+    parser.add_argument("--doctor", choices=POLICIES, default="greedy_doctor", help="Doctor policy")
+    parser.add_argument("--knight", choices=POLICIES, default="disinfect_knight", help="Knight policy")
+    parser.add_argument("--seed", type=int, metavar="", default=0, help="Seed of the first game")
+    parser.add_argument("--max_rounds", type=int, metavar="", default=500, help="Rounds before a game is stopped")
+    parser.add_argument("--stats", type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="Add phase timings and event counters")
+    parser.add_argument("-p", "--processes", type=int, metavar="", default=None, help="Pool size")
+    args = parser.parse_args()
+
+    print(json.dumps(simulate(args.games, *args.size, args.cities, args.city_size, args.doctor, args.knight,
+                              args.seed, args.max_rounds, args.processes, args.stats), indent=2))
@@ -0,0 +1,342 @@
+"""
+Versioned binary snapshots of Purge games.
+
+A snapshot is a fixed header, a table of sections then the sections, each a
+packed little-endian array:
+
+    header   magic, version, flags, map parameters, clock and section count
+    table    (typecode, offset, item count) of every section in `SECTIONS`
+    sections board layers, city and road index tables, pawn records, rngs
+
+Squares are stored by flat index `i*N + j`. Cities, roads and pawns refer to
+each other by index instead of holding objects, so a snapshot can be read
+straight out of a memory map by `SnapshotView` without building a game:
+
+    Snapshot.save(purge, "round_900.purge")
+    purge = Snapshot.load("round_900.purge")
+    with SnapshotView("round_900.purge") as view: view.header["round"]
+"""
+from __future__ import annotations
+import sys, struct, mmap
+from array import array
+from typing import *
+from Purge import Purge, Cell, SharedRow
+from Utils import *
+from Characters import *
+from ArrayBoard import np
+
+MAGIC = b"PRGS"
+"First bytes of every snapshot"
+VERSION = 2
+"Format version, bumped whenever the layout changes"
+
+FLAG_ARRAY_BOARD, FLAG_SEEDED = 1, 2
+"Header flag bits"
+
+BASE_EMPTY, BASE_TREE, BASE_ROAD = -1, -2, -3
+"Base layer values of the squares that are not a city, city squares store their city index"
+
+PAWN_DOCTOR, PAWN_KNIGHT, PAWN_NURSE = 0, 1, 2
+"Kinds of pawn records"
+
+_HEADER = struct.Struct("<4sHHiiiiqiqiI")
+"magic, version, flags, M, N, city_count, city_size, seed, round, reserved (0), nurse slots, section count"
+_ENTRY = struct.Struct("<c7xQQ")
+"typecode, byte offset, item count"
+
+SECTIONS: List[Tuple[str, str]] = [
+    ("base", "h"),          # base layer, city index or BASE_*
+    ("depth", "B"),         # stack depth of the disease of each square, 0 if not infected
+    ("timer", "i"),         # expiry round of the `noUpdateCnt` timer of each square
+    ("cityIndex", "i"),     # start of each city in `cityCells`, city count + 1 items
+    ("cityCells", "i"),     # squares of every city, root first then row-major
+    ("frontierIndex", "i"), # start of each city in `frontier`, city count + 1 items
+    ("frontier", "i"),      # squares of the frontier diseases of every city in order
+    ("registry", "i"),      # infected squares in `diseaseSeeds` order
+    ("pathIndex", "i"),     # start of each road path in `paths`, path count + 1 items
+    ("paths", "i"),         # squares of every road path
+    ("roads", "i"),         # (city, gate, end, path) per `roadsTo` entry in order
+    ("pawns", "i"),         # (kind, square, stack depth, nurse slot, counter, delta i, delta j) per pawn
+    ("rng", "B"),           # states of the random streams, see `_packRngs`
+]
+"Sections of a snapshot in file order, with their array typecode"
+
+_PAWN_FIELDS, _ROAD_FIELDS = 7, 4
+
+
+def _asLittle(arr: array) -> array:
+    if sys.byteorder != "little": arr.byteswap()
+    return arr
+
+
+# =============================
+# Random streams
+# =============================
+_RNG_STATE = struct.Struct("<i625I?d")
+"version, Mersenne Twister state, whether a gauss value is kept, gauss value"
+
+def _packRngs(purge: Purge) -> bytes:
+    "The states of `rng`, `genRng`, `spreadRng` and `aiRng`"
+    parts = []
+    for rng in (purge.rng, purge.genRng, purge.spreadRng, purge.aiRng):
+        version, state, gauss = rng.getstate()
+        parts.append(_RNG_STATE.pack(version, *state, gauss is not None, 0.0 if gauss is None else gauss))
+    return b"".join(parts)
+
+def _unpackRngs(purge: Purge, data: bytes) -> None:
+    size = _RNG_STATE.size
+    for k, rng in enumerate((purge.rng, purge.genRng, purge.spreadRng, purge.aiRng)):
+        version, *state, hasGauss, gauss = _RNG_STATE.unpack_from(data, k * size)
+        rng.setstate((version, tuple(state), gauss if hasGauss else None))
+
+
+# =============================
+# Saving
+# =============================
+def _stackDepth(purge: Purge, pos: Tuple[int, int], obj: object) -> int:
+    for k, el in enumerate(purge.map[pos[0]][pos[1]].stk):
+        if el is obj: return k
+    raise ValueError(f"{obj.__class__.__name__} is not on its square {pos}")
+
+def dumps(purge: Purge) -> bytes:
+    """Encode the whole state of a game"""
+    M, N, cities = purge.M, purge.N, purge.cities
+    flat = lambda pos: pos[0] * N + pos[1]
+    sec: Dict[str, array] = {name: array(code) for name, code in SECTIONS}
+
+    # ◼︎ cities, frontiers and the static base layer
+    base = sec["base"] = array("h", [BASE_TREE]) * (M * N)
+    sec["cityIndex"].append(0)
+    sec["frontierIndex"].append(0)
+    for c, city in enumerate(cities):
+        cells = [flat(city.root)] + sorted(flat(pos) for pos in city.cells_pos if pos != city.root)
+        sec["cityCells"].extend(cells)
+        sec["cityIndex"].append(len(sec["cityCells"]))
+        for k in cells: base[k] = c
+        sec["frontier"].extend(flat(d.root) for d in city.edgeDiseases)
+        sec["frontierIndex"].append(len(sec["frontier"]))
+
+    # ◼︎ roads, a path shared by both of its directions is stored once
+    pathIds: Dict[int, int] = {}
+    sec["pathIndex"].append(0)
+    for c, city in enumerate(cities):
+        for gate, roads in city.roadsTo.items():
+            for end, path in roads:
+                if (pid:= pathIds.get(id(path))) is None:
+                    pid = pathIds[id(path)] = len(pathIds)
+                    sec["paths"].extend(flat(pos) for pos in path)
+                    sec["pathIndex"].append(len(sec["paths"]))
+                    for pos in path[1:-1]: base[flat(pos)] = BASE_ROAD
+                sec["roads"].extend((c, flat(gate), flat(end), pid))
+
+    # ◼︎ diseases and timers, only city squares can hold either
+    depth = sec["depth"] = array("B", bytes(M * N))
+    for d in purge.diseaseSeeds:
+        sec["registry"].append(k:= flat(d.root))
+        depth[k] = _stackDepth(purge, d.root, d)
+    timer = sec["timer"] = array("i", bytes(4 * M * N))
+    if purge.board:
+        timer = sec["timer"] = array("i", purge.board.timer.tobytes())
+    else:
+        for k in sec["cityCells"]:
+            timer[k] = purge.map[k // N][k % N].expiry
+
+    # ◼︎ pawns
+    pawns = sec["pawns"]
+    for kind, pawn in ((PAWN_DOCTOR, purge.doctor), (PAWN_KNIGHT, purge.knight)):
+        pawns.extend((kind, flat(pawn.root), _stackDepth(purge, pawn.root, pawn), -1, 0, 0, 0))
+    for slot, nurse in enumerate(purge.nurses):
+        if nurse is None: continue
+        pawns.extend((PAWN_NURSE, flat(nurse.root), _stackDepth(purge, nurse.root, nurse),
+                      slot, nurse.counter, *nurse.delta))
+
+    sec["rng"] = array("B", _packRngs(purge))
+
+    # ◼︎ header, table then sections
+    flags = (FLAG_ARRAY_BOARD if purge.board else 0) | (FLAG_SEEDED if purge.seed is not None else 0)
+    header = _HEADER.pack(MAGIC, VERSION, flags, M, N, purge.city_count, purge.city_size,
+                          purge.seed if purge.seed is not None else 0, purge.timers.round,
+                          0, len(purge.nurses), len(SECTIONS))
+    offset = _HEADER.size + _ENTRY.size * len(SECTIONS)
+    table, blobs = [], []
+    for name, code in SECTIONS:
+        blob = _asLittle(sec[name]).tobytes()
+        blob += bytes(-len(blob) % 8) # keep every section 8 byte aligned
+        table.append(_ENTRY.pack(code.encode(), offset, len(sec[name])))
+        blobs.append(blob)
+        offset += len(blob)
+    return b"".join([header, *table, *blobs])
+
+def save(purge: Purge, path: str) -> int:
+    """Write a snapshot of the game to `path`
+    ### return
+        - `int`: number of bytes written
+    """
+    data = dumps(purge)
+    with open(path, "wb") as f: f.write(data)
+    return len(data)
+
+
+# =============================
+# Reading
+# =============================
+def _readHeader(buf: Union[bytes, memoryview, mmap.mmap]) -> Dict[str, Any]:
+    magic, version, flags, M, N, cityCount, citySize, seed, round, _, nurseSlots, count = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC: raise ValueError("Not a Purge snapshot")
+    if version != VERSION: raise ValueError(f"Unsupported snapshot version {version}, expected {VERSION}")
+    return {
+        "version": version, "arrayBoard": bool(flags & FLAG_ARRAY_BOARD),
+        "M": M, "N": N, "city_count": cityCount, "city_size": citySize,
+        "seed": seed if flags & FLAG_SEEDED else None, "round": round,
+        "nurseSlots": nurseSlots, "sections": count,
+    }
+
+def _readTable(buf: Union[bytes, memoryview, mmap.mmap], count: int) -> Dict[str, Tuple[str, int, int]]:
+    table = {}
+    for k, (name, code) in enumerate(SECTIONS[:count]):
+        typecode, offset, items = _ENTRY.unpack_from(buf, _HEADER.size + k * _ENTRY.size)
+        if typecode.decode() != code: raise ValueError(f"Section {name} has type {typecode!r}, expected {code}")
+        table[name] = (code, offset, items)
+    return table
+
+
+class SnapshotView():
+    """
+    Read-only view over a snapshot file through a memory map. Sections are
+    exposed as typed memoryviews, so scanning many saved positions only pages
+    in the parts that are read. Only valid on little-endian machines.
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = _readHeader(self._map)
+        "Parameters of the saved game, see `_readHeader`"
+        self.table = _readTable(self._map, self.header["sections"])
+        "(typecode, byte offset, item count) of each section by name"
+
+    def section(self, name: str) -> memoryview:
+        "The named section as a flat typed memoryview"
+        code, offset, items = self.table[name]
+        return memoryview(self._map)[offset:offset + items * array(code).itemsize].cast(code)
+
+    @property
+    def diseaseCount(self) -> int:
+        return self.table["registry"][2]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> SnapshotView:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# =============================
+# Loading
+# =============================
+def loads(data: Union[bytes, memoryview], array_board: bool=None) -> Purge:
+    """Rebuild a game from a snapshot
+    ## params
+        - `array_board`: board kind of the new game, the saved one if not provided
+    """
+    hdr, sec = _readHeader(data), {}
+    for name, (code, offset, items) in _readTable(data, hdr["sections"]).items():
+        arr = array(code)
+        arr.frombytes(data[offset:offset + items * arr.itemsize])
+        sec[name] = _asLittle(arr)
+
+    M, N = hdr["M"], hdr["N"]
+    arrayBoard = hdr["arrayBoard"] if array_board is None else array_board
+    purge = Purge(M, N, hdr["city_count"], hdr["city_size"], array_board=arrayBoard,
+                  seed=hdr["seed"], generate=False)
+    map, board, timers = purge.map, purge.board, purge.timers
+    pos = lambda k: (k // N, k % N)
+
+    # ◼︎ cities and terrain
+    cityIndex, cityCells = sec["cityIndex"], sec["cityCells"]
+    cities: List[City] = []
+    for c in range(len(cityIndex) - 1):
+        cells = cityCells[cityIndex[c]:cityIndex[c + 1]]
+        cities.append(city:= City(purge, *pos(cells[0])))
+        city.cells_pos = frozenset(pos(k) for k in cells) # geometry is computed when first needed
+    base = sec["base"]
+    if board:
+        board.base[:, :] = np.frombuffer(base.tobytes(), dtype=np.int16).reshape(M, N)
+        board.cityObjs, board.cityCodes = list(cities), {city: c for c, city in enumerate(cities)}
+    else:
+        # ◼︎ rows start as one template cell per base, the squares holding more get their own cell below
+        templates = {BASE_EMPTY: Cell(timers)}
+        for b, obj in ((BASE_TREE, TREE), (BASE_ROAD, ROAD), *enumerate(cities)):
+            templates[b] = Cell(timers)
+            templates[b].stk.append(obj)
+        rows = [[templates[b] for b in base[i * N:(i + 1) * N]] for i in range(M)]
+        owned: Dict[int, Cell] = {}
+
+    def cellAt(k: int) -> Union[Cell, object]:
+        "The cell of square `k`, on a `Cell` map its own copy of the template"
+        if board: return map[k // N][k % N]
+        if (cell:= owned.get(k)) is None:
+            row, j = rows[k // N], k % N
+            cell = owned[k] = Cell(timers)
+            cell.stk.extend(row[j].stk)
+            row[j] = cell
+        return cell
+
+    pathIndex, paths, roads = sec["pathIndex"], sec["paths"], sec["roads"]
+    pathList = [[pos(k) for k in paths[pathIndex[p]:pathIndex[p + 1]]] for p in range(len(pathIndex) - 1)]
+    for r in range(0, len(roads), _ROAD_FIELDS):
+        c, gate, end, pid = roads[r:r + _ROAD_FIELDS]
+        cities[c].addRoad(pos(gate), pos(end), pathList[pid])
+
+    # ◼︎ stacks: diseases and pawns in the saved stack order
+    depth, diseases = sec["depth"], {k: Disease(purge, pos(k)) for k in sec["registry"]}
+    placed = [(k, depth[k], d) for k, d in diseases.items()]
+    purge.nurses = [None] * hdr["nurseSlots"]
+    pawns = sec["pawns"]
+    for r in range(0, len(pawns), _PAWN_FIELDS):
+        kind, k, d, slot, counter, di, dj = pawns[r:r + _PAWN_FIELDS]
+        if kind == PAWN_DOCTOR:
+            pawn = purge.doctor = Doctor(purge, pos(k))
+        elif kind == PAWN_KNIGHT:
+            pawn = purge.knight = Knight(purge, pos(k))
+        else:
+            i, j = pos(k)
+            pawn = Nurse(purge, (i + di, j + dj), (i, j))
+            pawn.counter = counter
+            purge.nurses[slot] = pawn
+        placed.append((k, d, pawn))
+    placed.sort(key=lambda item: (item[0], item[1]))
+    for k, _, obj in placed:
+        cellAt(k).putOnTop(obj)
+
+    # ◼︎ registry, counters and frontiers
+    for k, d in diseases.items():
+        city = cities[base[k]]
+        purge.diseaseSeeds.add(d, city)
+        city.infectedCnt += 1
+    purge.overRunCities.update(city for city in cities if city.isOverrun)
+    frontierIndex, frontier = sec["frontierIndex"], sec["frontier"]
+    for c, city in enumerate(cities if not board else ()):
+        city.frontier = IndexedSet(purge.diseaseSeeds.at(pos(k)) for k in frontier[frontierIndex[c]:frontierIndex[c + 1]])
+
+    # ◼︎ clock and timers
+    timers.round, timer = hdr["round"], sec["timer"]
+    if board:
+        board.timer[:, :] = np.frombuffer(timer.tobytes(), dtype=np.int32).reshape(M, N)
+    else:
+        for k in cityCells:
+            if (expiry:= timer[k]): cellAt(k).expiry = expiry
+        # ◼︎ each row gets its own cells on first access
+        for i in range(M): map[i] = SharedRow(purge, i, rows[i])
+
+    purge.cities = cities
+    if board: board.freeze(cities)
+    _unpackRngs(purge, bytes(sec["rng"]))
+    return purge
+
+def load(path: str, array_board: bool=None) -> Purge:
+    """Rebuild a game from a snapshot file, see `loads`"""
+    with open(path, "rb") as f: return loads(f.read(), array_board)
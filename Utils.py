@@ -1,6 +1,6 @@
 """Utility Module for the game purge"""
 from __future__ import annotations
-import os, sys, argparse, timeit, requests, random, copy
+import os, sys, argparse, timeit, requests, random, copy, time, json, threading
 from typing import *
 from pathlib import Path
 from Logger import Logger, DebugLevel
@@ -12,6 +12,9 @@ if TYPE_CHECKING:
     from Purge import Cell
     from Characters import Tree
 
+LOGGER = Logger(DebugLevel.INFO)
+"Logger shared by the game modules"
+
 DIRECTIONS_ADJ = [(1,0),(-1,0),(0,1),(0,-1)]
 "Directions difference to adjacent cells, [s, w, d, a]"
 DIRECTIONS_ALL = DIRECTIONS_ADJ + [(1,1),(-1,1),(1,-1),(-1,-1)]
@@ -35,170 +38,402 @@ def isType(elem: object, targetType: Union[type, List[type]]) -> bool:
         return type(elem) in targetType
 
 
-class PathFinder:
-    """Class contains functions for finding path between points on the grid"""
-    class Node():
-        """A node for A star"""
-        def __init__(self, position: Tuple[int, int], parent=None):
-            self.parent = parent
-            self.i, self.j = position[0], position[1]
-
-            self.g = 0
-            "distance, cost"
-            self.h = 0
-            "heuristic, estimated cost"
-            self.f = 0
-            "score, sum of g(n) + h(n)"
-        
-        def getPosition(self) -> Tuple[int, int]:
-            return (self.i, self.j)
+class Stencils():
+    """
+    Neighbourhoods of the squares of an M x N board with the squares off the
+    board already left out, one instance per board size among the last
+    `MAX_BOARDS` sizes used (see `of`), a game keeps its own in `Purge.stencils`.
+
+    The direction offsets are clipped once per border class (how close a
+    square is to each side of the board), so flat index loops such as `astar`
+    need no bounds check. The neighbourhoods as positions are built the first
+    time a square asks for them and then reused, so the game loops do not
+    build tuples and big boards only pay for the squares in play.
+    """
+    ADJACENT, AROUND, AREA, REACH = range(4)
+    "Stencil kinds: the 4 adjacent squares, the 8 around, the 3x3 area and the disinfectant targets"
+    DIRECTIONS = [
+        DIRECTIONS_ADJ,
+        DIRECTIONS_ALL,
+        DIRECTIONS_ALL + [(0, 0)],
+        [(di*2, dj*2) for di, dj in DIRECTIONS_ALL],
+    ]
+    "Directions of each stencil kind, in the order the neighbours are listed"
+    RADIUS = 2
+    "Farthest reach of a stencil"
+    MAX_BOARDS = 16
+    "Board sizes kept by `of`, the least recently used one is dropped first"
+    _boards: Dict[Tuple[int, int], Stencils] = {}
+    "Stencils by board size, least recently used first"
+    _lock = threading.Lock()
+    __slots__ = ("M", "N", "squareClass", "_offsets", "_positions")
+
+    @classmethod
+    def of(cls, M: int, N: int) -> Stencils:
+        "The stencils of an M x N board, shared by the boards of that size created while it is kept"
+        with cls._lock:
+            boards = cls._boards
+            if (res:= boards.pop((M, N), None)) is None:
+                res = cls(M, N)
+                while len(boards) >= cls.MAX_BOARDS: del boards[next(iter(boards))]
+            boards[(M, N)] = res
+            return res
 
-        def __eq__(self, other):
-            return self.getPosition() == other.getPosition()
+    def __init__(self, M: int, N: int) -> None:
+        self.M, self.N = M, N
+        R = self.RADIUS
+        # ◼︎ a border class is how far (up to `RADIUS`) a square is from both ends of an axis
+        rowKeys = [(min(i, R), min(M - 1 - i, R)) for i in range(M)]
+        colKeys = [(min(j, R), min(N - 1 - j, R)) for j in range(N)]
+        rowClasses, colClasses = sorted(set(rowKeys)), sorted(set(colKeys))
+        colCls = [colClasses.index(key) for key in colKeys]
+        rows = [bytes(r * len(colClasses) + c for c in colCls) for r in range(len(rowClasses))]
+        self.squareClass = bytearray().join(rows[rowClasses.index(key)] for key in rowKeys)
+        "Border class of each square, flat indexed by i*N + j"
+        self._offsets: List[List[Tuple[Tuple[int, int, int], ...]]] = [
+            [tuple((di*N + dj, di, dj) for di, dj in dirs if -up <= di <= down and -left <= dj <= right)
+             for up, down in rowClasses for left, right in colClasses]
+            for dirs in self.DIRECTIONS
+        ]
+        "(flat offset, di, dj) of the neighbours on the board, per stencil kind and border class"
+        self._positions: List[Dict[int, Tuple[Tuple[int, int], ...]]] = [{} for _ in self.DIRECTIONS]
+        "Neighbour positions of the squares asked for so far, per stencil kind and flat index"
+
+    def table(self, kind: int) -> List[Tuple[Tuple[int, int, int], ...]]:
+        """(flat offset, di, dj) of the neighbours on the board per border class,
+            the neighbours of the square at flat index k are `table(kind)[squareClass[k]]`
+        """
+        return self._offsets[kind]
+
+    def offsets(self, kind: int, i: int, j: int) -> Tuple[Tuple[int, int, int], ...]:
+        "(flat offset, di, dj) of the neighbours of square (i, j) that are on the board"
+        return self._offsets[kind][self.squareClass[i*self.N + j]]
+
+    def positions(self, kind: int, i: int, j: int) -> Tuple[Tuple[int, int], ...]:
+        "Positions of the neighbours of square (i, j) that are on the board"
+        memo = self._positions[kind]
+        if (res:= memo.get(i*self.N + j)) is None:
+            res = memo[i*self.N + j] = tuple((i + di, j + dj) for _, di, dj in self.offsets(kind, i, j))
+        return res
+
+    def adjacent(self, i: int, j: int) -> Tuple[Tuple[int, int], ...]:
+        return self.positions(Stencils.ADJACENT, i, j)
+
+    def around(self, i: int, j: int) -> Tuple[Tuple[int, int], ...]:
+        "The 8 squares around, the area a nurse cures"
+        return self.positions(Stencils.AROUND, i, j)
+
+    def area(self, i: int, j: int) -> Tuple[Tuple[int, int], ...]:
+        "The 3x3 area centered on the square, the square itself last"
+        return self.positions(Stencils.AREA, i, j)
+
+    def reach(self, i: int, j: int) -> Tuple[Tuple[int, int], ...]:
+        "The squares two steps away in the 8 directions, where the disinfectant can be thrown"
+        return self.positions(Stencils.REACH, i, j)
+
+
+class IndexedSet():
+    """A set that can also be indexed, so `random.choice` picks from it in O(1)
+        without building a list. Removing moves the last element into the 
+        hole, so the order only depends on the sequence of operations
+    """
+    __slots__ = ("items", "index")
 
-        def __hash__(self) -> int:
-            return hash(self.getPosition())
+    def __init__(self, items: Iterable[Any]=()) -> None:
+        self.items: List[Any] = []
+        self.index: Dict[Any, int] = {}
+        for item in items: self.add(item)
 
-        def __gt__(self, other):
-            "Comparing two nodes"
-            # return self.getPosition() > other.getPosition() # is after
-            # ◼︎ alternative: cannot be directely used as min heap element
-            return self.f > other.f
+    def add(self, item: Any) -> None:
+        if item in self.index: return
+        self.index[item] = len(self.items)
+        self.items.append(item)
 
+    def discard(self, item: Any) -> None:
+        if (k:= self.index.pop(item, None)) is None: return
+        last = self.items.pop()
+        if k < len(self.items):
+            self.items[k] = last
+            self.index[last] = k
 
-    @staticmethod
-    def astar(grid: List[List[Cell]], 
-              start: Tuple[int, int], 
-              end: Tuple[int, int],
-              obstacles: List[Any] = [1]) -> Union[List[Tuple[int,int]], Literal[-1]]:
+    def clear(self) -> None:
+        self.items.clear()
+        self.index.clear()
 
-        def getNeighbors(cur_node: PathFinder.Node) -> List[PathFinder.Node]:
-            """ 
-            Get a list of neighboring nodes based on current node position
-            """
-            res: List[PathFinder.Node] = []
-            for di, dj in DIRECTIONS_ADJ:
-                neiI, neiJ = cur_node.i + di, cur_node.j + dj
+    def __contains__(self, item: Any) -> bool:
+        return item in self.index
 
-                if not inBounds(neiI, neiJ, M, N): continue
-                if (grid[neiI][neiJ].peek() in obstacles and (neiI, neiJ) not in [start, end]): continue
+    def __len__(self) -> int:
+        return len(self.items)
 
-                new_node = PathFinder.Node((neiI, neiJ), cur_node)
-                res.append(new_node)
-            return res
+    def __getitem__(self, k: int) -> Any:
+        return self.items[k]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.items)
+
+
+class _Phase():
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats: Stats, name: str) -> None:
+        self.stats, self.name = stats, name
+
+    def __enter__(self) -> _Phase:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stats.addTime(self.name, time.perf_counter() - self.start)
 
-            
-        M, N = len(grid), len(grid[0])
-        start_node, end_node = PathFinder.Node(start), PathFinder.Node(end)
 
-        minQ: List[PathFinder.Node] = []
-        visited: Set[PathFinder.Node] = set()
+class _NullPhase():
+    __slots__ = ()
 
-        # Add the start node
-        heapq.heappush(minQ, start_node)
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+_NULL_PHASE = _NullPhase()
+
+
+class Stats():
+    """Phase timers and event counters of a game
+
+    Disabled by default: `phase` then hands back a shared no-op context and 
+    callers check `enabled` before counting, so the instrumented code only 
+    pays an attribute lookup. Hot loops count locally and report once.
+
+        with stats.phase("spread"): ...
+        if stats.enabled: stats.count("cellsTouched")
+    """
+    __slots__ = ("enabled", "times", "calls", "counters")
+
+    def __init__(self, enabled: bool=False) -> None:
+        self.enabled = enabled
+        "Record anything at all"
+        self.times: Dict[str, float] = {}
+        "Seconds spent in each phase"
+        self.calls: Dict[str, int] = {}
+        "Number of times each phase ran"
+        self.counters: Dict[str, int] = {}
+        "Event counts by name"
+
+    def phase(self, name: str) -> Union[_Phase, _NullPhase]:
+        "Context timing a phase named `name`"
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def addTime(self, name: str, seconds: float, calls: int=1) -> None:
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name: str, n: int=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        self.times.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def merge(self, other: Union[Stats, Dict[str, Any]]) -> None:
+        "Add the numbers of another `Stats` (or its `toDict`) to this one"
+        data = other.toDict() if isinstance(other, Stats) else other
+        for name, phase in data["phases"].items(): self.addTime(name, phase["seconds"], phase["calls"])
+        for name, n in data["counters"].items(): self.count(name, n)
+
+    def toDict(self) -> Dict[str, Any]:
+        return {
+            "phases": {name: {"seconds": self.times[name], "calls": self.calls[name]} for name in self.times},
+            "counters": dict(self.counters),
+        }
+
+    def dump(self, path: str=None) -> str:
+        """The stats as JSON, also written to `path` if provided"""
+        text = json.dumps(self.toDict(), indent=2, sort_keys=True)
+        if path:
+            with open(path, "w") as f: f.write(text)
+        return text
+
+
+class PathFinder:
+    """Class contains functions for finding path between points on the grid"""
+    @staticmethod
+    def astar(grid: List[List[Cell]], 
+              start: Tuple[int, int], 
+              end: Tuple[int, int],
+              obstacles: Union[Collection[Any], Callable[[int, int], bool]] = [1]) -> Union[List[Tuple[int,int]], Literal[-1]]:
+        """Find a shortest 4-connected path from `start` to `end`
+        ## params
+            - `obstacles`: cells whose top most element is in here (a list or a set) 
+              cannot be walked through, or a predicate `(i, j) -> bool` telling if 
+              the cell is blocked. `start` and `end` are always allowed
+        ### return
+            - the path from `start` to `end` (both included), `-1` if there is none
+        """
+        M, N = len(grid), len(grid[0])
+        stencils = Stencils.of(M, N)
+        adjacent, squareClass = stencils.table(Stencils.ADJACENT), stencils.squareClass
+        (si, sj), (ei, ej) = start, end
+        isBlocked = obstacles if callable(obstacles) else lambda i, j: grid[i][j].peek() in obstacles
+        startIdx, endIdx = si*N + sj, ei*N + ej
+
+        # ◼︎ per cell state, flat indexed by i*N+j
+        gScore = [M*N] * (M*N)
+        parent = [-1] * (M*N)
+        closed = bytearray(M*N)
+
+        # ◼︎ (f, h, idx), lower h breaks ties toward the goal
+        # stale entries are skipped when popped instead of being decreased in place
+        gScore[startIdx] = 0
+        minQ = [(abs(si - ei) + abs(sj - ej), 0, startIdx)]
 
         while minQ:
-            cur_node = heapq.heappop(minQ)
-            visited.add(cur_node)
+            _, _, idx = heapq.heappop(minQ)
+            if closed[idx]: continue
+            closed[idx] = 1
 
             # Found the goal
-            if cur_node == end_node:
+            if idx == endIdx:
                 path: List[Tuple[int, int]] = []
-                ptr = cur_node
-                while ptr is not None:
-                    path.append(ptr.getPosition())
-                    ptr = ptr.parent
+                while idx != -1:
+                    path.append(divmod(idx, N))
+                    idx = parent[idx]
                 return path[::-1] # Return reversed path
 
-            neighbors = getNeighbors(cur_node)
-            for nei in neighbors:
-                if nei in visited: continue
+            i, j = divmod(idx, N)
+            g = gScore[idx] + 1
+            for d, di, dj in adjacent[squareClass[idx]]:
+                neiIdx, neiI, neiJ = idx + d, i + di, j + dj
+                if closed[neiIdx] or g >= gScore[neiIdx]: continue
+                if neiIdx != endIdx and isBlocked(neiI, neiJ): continue
 
-                nei.g = cur_node.g + 1
-                nei.h = max((nei.i - end_node.i), (nei.j - end_node.j)) + 1
-                nei.f = nei.g + nei.h
-
-                for node in minQ:
-                    # if the same node but perform worse
-                    # if nei == node and nei.g > node.g: continue
-                    if nei == node and nei > node: continue
-
-                minQ.append(nei)
+                gScore[neiIdx], parent[neiIdx] = g, idx
+                h = abs(neiI - ei) + abs(neiJ - ej) # manhattan, admissible on 4-connected grid
+                heapq.heappush(minQ, (g + h, h, neiIdx))
         return -1
 
 
 class DisjointSet():
+    """Union find over flat integer arrays (path halving, union by rank), 
+        nothing in here recurses so it works on boards of millions of cells
+    """
+    __slots__ = ("parent", "rank", "cnt")
+
+    def __init__(self, size: int) -> None:
+        self.parent: List[int] = list(range(size))
+        "Parent of each element, roots are their own parent"
+        self.rank = bytearray(size)
+        "Upper bound of each root's tree height"
+        self.cnt = size
+        "Number of disjoint sets"
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]] # path halving
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """Merge the sets of `a` and `b`
+        ### return
+            - `bool`: `False` if they were already in the same set
+        """
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb: return False
+        if self.rank[ra] < self.rank[rb]: ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]: self.rank[ra] += 1
+        self.cnt -= 1
+        return True
+
+    @staticmethod
+    def label(mask: Sequence[Any], M: int, N: int) -> Tuple[int, List[int]]:
+        """Label the 4-connected components of a flat `M*N` mask (index `i*N+j`)
+            in a single scanline pass merging each cell with its left and up neighbors
+        ### return
+            - `int`: number of components
+            - `List[int]`: component of each cell numbered in row-major order 
+              of their first cell, `-1` for cells not in the mask
+        """
+        parent = list(range(M*N))
+        rank = bytearray(M*N)
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        def union(a: int, b: int) -> None:
+            ra, rb = find(a), find(b)
+            if ra == rb: return
+            if rank[ra] < rank[rb]: ra, rb = rb, ra
+            parent[rb] = ra
+            if rank[ra] == rank[rb]: rank[ra] += 1
+
+        for i in range(M):
+            left = upLeft = False
+            for k in range(i*N, i*N + N):
+                up = i > 0 and mask[k-N]
+                if mask[k]:
+                    if left: parent[k] = parent[k-1] # continue the run of the left cell
+                    # up is already merged through left and up-left otherwise
+                    if up and not (left and upLeft): union(k, k-N)
+                    left = True
+                else:
+                    left = False
+                upLeft = up
+
+        labels, rootLabel = [-1] * (M*N), {}
+        for k in range(M*N):
+            if not mask[k]: continue
+            r = find(k)
+            if (l:= rootLabel.get(r)) is None: l = rootLabel[r] = len(rootLabel)
+            labels[k] = l
+        return len(rootLabel), labels
+
 
     class Merger:
+        @staticmethod
+        def _mask(grid: List[List[Cell]], isTarget: Callable[[object], bool]) -> List[bool]:
+            return [isTarget(cell.peek()) for row in grid for cell in row]
+
+        @staticmethod
+        def _parentMap(labels: List[int], M: int, N: int) -> List[List[Tuple[int,int]]]:
+            "2D map of each cell's root (first cell of its component), `(-1,-1)` if not in any"
+            roots = {}
+            for k, l in enumerate(labels):
+                if l >= 0: roots.setdefault(l, divmod(k, N))
+            return [[roots[labels[i*N+j]] if labels[i*N+j] >= 0 else (-1,-1) for j in range(N)] for i in range(M)]
+
         @staticmethod
         def unionFind_merge(grid: List[List[Cell]], targetValue: Any, verbose=False) -> int:
-            """Modified version of union find"""
+            """Count the connected groups of cells whose top most element is `targetValue`"""
             M, N = len(grid), len(grid[0])
-            class UnionFind():
-                def __init__(self):
-                    self.cnt = 0
-                    self.parent = [[(-1,-1)] * N for _ in range(M)]
-
-                    for i in range(M): # set root to itself
-                        for j in range(N):
-                            if grid[i][j].peek() == targetValue:
-                                self.parent[i][j] = (i, j) 
-                                self.cnt += 1
-                
-                def find(self, i, j) -> Tuple[int, int]:
-                    if self.parent[i][j] != (i,j):
-                        self.parent[i][j] = self.find(*self.parent[i][j])
-                    return self.parent[i][j]
-
-                def backprop(self, i, j, val) -> Tuple[int, int]:
-                    if (nextPos:= self.parent[i][j]) != (i,j):
-                        self.backprop(*nextPos, val)
-                    self.parent[i][j] = val
-                
-                def union(self, pos1: Tuple[int,int], pos2: Tuple[int,int]) -> int:
-                    r1, r2 = self.find(*pos1), self.find(*pos2) # two roots
-                    if r1 != r2:
-                        if r1 <= r2:
-                            self.backprop(*r2, r1)
-                        else:
-                            self.backprop(*r1, r2)
-                        self.cnt -= 1 # result of combined two (unfinished) island
-            
-            uf = UnionFind()
-            for i in range(M):
-                for j in range(N):
-                    if grid[i][j].peek() != targetValue: continue
-                    for di, dj in DIRECTIONS_ADJ:
-                        if (0<= (newX:=i+di) < M) and (0<= (newY:=j+dj) < N) and grid[newX][newY] == targetValue:
-                            uf.union((i,j), (newX, newY))
-            
-            if verbose: DisjointSet.Merger.printParentMap(uf.parent)
-            return uf.cnt
+            cnt, labels = DisjointSet.label(DisjointSet.Merger._mask(grid, lambda v: v == targetValue), M, N)
+            if verbose: DisjointSet.Merger.printParentMap(DisjointSet.Merger._parentMap(labels, M, N))
+            return cnt
 
         @staticmethod
-        def dfsUnion(grid: List[List[Cell]], targetValue: List[Any], verbose=False):
+        def dfsUnion(grid: List[List[Cell]], targetValue: List[Any], verbose=False) -> Set[Tuple[int,int]]:
+            """Find the connected groups of cells whose top most element is in `targetValue`
+            ### return
+                - the root (first cell in row-major order) of each group
+            """
             M, N = len(grid), len(grid[0])
-            roots = set()
-            def dfs(x, y):
-                nonlocal i, j
-                
-                if not (0 <= x < M and 0 <= y < N): return
-                elif parent[x][y] == (-1,-1): return
-                elif parent[x][y] != (x, y): return # already converted
-
-                parent[x][y] = (i, j)
-                roots.add((i,j))
-                for di, dj in DIRECTIONS_ADJ:
-                    dfs(x+di, y+dj)
-            
-            parent = [[(-1,-1) if not grid[i][j].peek() in targetValue else (i, j) for j in range(N)] for i in range(M)]
-            for i in range(M):
-                for j in range(N):
-                    if len(grid[i][j]) == 0: continue
-                    dfs(i, j)
-
-            if verbose: DisjointSet.Merger.printParentMap(parent)
-            return roots
+            try:
+                targets = set(targetValue)
+            except TypeError:
+                targets = targetValue
+            cnt, labels = DisjointSet.label(DisjointSet.Merger._mask(grid, lambda v: v in targets), M, N)
+            roots = {}
+            for k, l in enumerate(labels):
+                if l >= 0 and l not in roots: roots[l] = divmod(k, N)
+            if verbose: DisjointSet.Merger.printParentMap(DisjointSet.Merger._parentMap(labels, M, N))
+            return set(roots.values())
 
 
         @staticmethod